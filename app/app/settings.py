@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -45,6 +46,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'products.metrics.metrics_middleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -59,11 +61,23 @@ ROOT_URLCONF = 'app.urls'
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
         "rest_framework.authentication.SessionAuthentication",
-        "rest_framework.authentication.TokenAuthentication"
+        "products.authentication.CachedTokenAuthentication"
     ],
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
+    "DEFAULT_THROTTLE_CLASSES": [
+        "products.throttling.TokenBucketThrottle"
+    ],
+    # Unsafe requests per user, or per IP address of anonymous requests
+    "DEFAULT_THROTTLE_RATES": {
+        "write": os.environ.get("THROTTLE_WRITE_RATE", "60/min"),
+    },
 }
 
+# Throttle buckets kept in memory of each process
+THROTTLE_BUCKETS_SIZE = 10000
+# Cache alias to share throttle buckets between processes, None keeps them in memory
+THROTTLE_CACHE_ALIAS = None
+
 
 SPECTACULAR_SETTINGS = {
     'TITLE': 'Products API',
@@ -94,13 +108,97 @@ WSGI_APPLICATION = 'app.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.1/ref/settings/#databases
 
+# "production" turns on SQLite tuning for concurrent readers and writers
+# and persistent connections, see start_production.sh
+DATABASE_PROFILE = os.environ.get('DATABASE_PROFILE', 'development')
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': 600 if DATABASE_PROFILE == 'production' else 0,
+        'CONN_HEALTH_CHECKS': True,
+    }
+}
+
+# Optional read-only connection used by list and retrieve endpoints.
+# Pointing it to the default database file gives reads their own connections.
+if os.environ.get('DATABASE_READ_REPLICA'):
+    DATABASES['replica'] = dict(
+        DATABASES['default'],
+        NAME=os.environ['DATABASE_READ_REPLICA'],
+        TEST={'MIRROR': 'default'},
+    )
+
+DATABASE_ROUTERS = ['products.database.ReadReplicaRouter']
+
+# Run on every new SQLite connection of the current DATABASE_PROFILE
+SQLITE_PRAGMAS = {
+    'development': {
+        'busy_timeout': 5000,
+    },
+    'production': {
+        'journal_mode': 'wal',
+        'synchronous': 'normal',
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -64 * 1024,
+        'busy_timeout': 5000,
+    },
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'products',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
     }
 }
 
+PRODUCTS_CACHE_ALIAS = 'default'
+
+PRODUCTS_CACHE_TIMEOUT = 300
+
+# Seconds between reads of the change counter, which make writes of other processes
+# (drain_ratings, import, compute_scores) stale cached products, lists and rankings of this one
+PRODUCTS_CACHE_POLL_SECONDS = 1
+
+# Bayesian and time-decayed scores, see products.scores.
+# Prior weight is the number of global mean ratings every product starts with.
+PRODUCTS_SCORE_PRIOR_WEIGHT = 10
+
+PRODUCTS_SCORE_HALF_LIFE_DAYS = 90
+
+# Best rated products in the typeahead index of each process, see products.suggest
+PRODUCTS_SUGGEST_SIZE = 100000
+
+# Seconds between reads of the change feed by the typeahead index
+PRODUCTS_SUGGEST_REFRESH_SECONDS = 5
+
+# Queue ratings for the drain_ratings worker instead of applying them in the request
+PRODUCTS_RATING_WRITE_BEHIND = os.environ.get('PRODUCTS_RATING_WRITE_BEHIND') == '1'
+
+# Products kept in memory, per process, for first pages of rating and price orderings
+PRODUCTS_RANKING_SIZE = 200
+
+# Cache of token authentication lookups, per process
+TOKEN_AUTH_CACHE_SIZE = 10000
+
+TOKEN_AUTH_CACHE_TTL = 60
+
+# Log requests running many similar queries
+METRICS_DETECT_N_PLUS_ONE = DEBUG
+
+METRICS_N_PLUS_ONE_THRESHOLD = 5
+
+# Encode product responses with orjson, if it is installed
+PRODUCTS_USE_ORJSON = True
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
@@ -0,0 +1,25 @@
+# Production server configuration
+# Usage: gunicorn -c gunicorn.conf.py
+
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+# Response cache, rankings, typeahead index and throttle buckets live in memory of each
+# worker, so more workers serve writes of the others only after a poll of the change counter,
+# see PRODUCTS_CACHE_POLL_SECONDS
+workers = int(os.environ.get("GUNICORN_WORKERS", 1))
+if os.environ.get("GUNICORN_ASGI") == "1":
+    # Django runs sync views of ASGI requests on one thread per worker
+    wsgi_app = "app.asgi:application"
+    worker_class = "uvicorn.workers.UvicornWorker"
+else:
+    # The API is made of sync views, so requests run on threads of WSGI workers
+    wsgi_app = "app.wsgi:application"
+    worker_class = "gthread"
+    threads = int(os.environ.get("GUNICORN_THREADS", 8))
+keepalive = 5
+timeout = 60
+graceful_timeout = 30
+max_requests = 10000
+max_requests_jitter = 1000
+accesslog = "-"
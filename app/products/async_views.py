@@ -0,0 +1,124 @@
+from asgiref.sync import sync_to_async
+from django.db.models import Count, Max
+from django.http import HttpResponseNotAllowed, JsonResponse
+from rest_framework import status
+
+from .cache import product_cache
+from .conditional import (cache_entry, cached_entry_response, list_validators,
+                          not_modified_response, row_validators, set_validators)
+from .database import use_read_replica
+from .encoders import PRODUCT_FIELDS, encode_rows
+from .export import EXPORT_FORMATS, aexport_stream, export_stream
+from .filters import InvalidFilter, afacet_buckets
+from .models import Product
+from .pagination import ORDERABLE_FIELDS, InvalidCursor, acursor_page, order_products, wants_meta
+from .streaming import AsyncStreamingHttpResponse
+from .views import (accepts_gzip, cursor_fields, cursor_page_response, cursor_per_page,
+                    invalid_export_format_response, invalid_order_by_response,
+                    invalid_per_page_response, json_response, list_query, numbered_page,
+                    numbered_page_response, numbered_page_rows, query_products, ranked_response,
+                    ranked_rows, set_export_headers)
+
+
+async def cached_response(request, key, build_response):
+    entry = await product_cache.aget(key)
+    if entry is not None:
+        return cached_entry_response(request, entry)
+    response = await build_response()
+    if response.status_code == status.HTTP_200_OK:
+        await product_cache.aset(key, cache_entry(response))
+    return response
+
+
+@use_read_replica
+async def product_list(request):
+    """
+    Async version of ProductViewSet.list
+    """
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+
+    async def build_response():
+        query, error = list_query(request.GET)
+        if error is not None:
+            return error
+        products, order_by, descending, fields, facets = query
+        rows = await sync_to_async(ranked_rows)(request.GET, order_by, descending)
+        if rows is not None:
+            return ranked_response(request, rows, fields[1] or fields[0])
+        if "cursor" in request.GET:
+            return await build_cursor_page(query)
+        watermark = await products.aaggregate(count=Count("id"), last_updated=Max("updated_at"))
+        validators = list_validators(request.GET, **watermark)
+        not_modified = not_modified_response(request, *validators)
+        if not_modified is not None:
+            return not_modified
+        page = numbered_page(request.GET, watermark["count"])
+        rows = [row async for row in numbered_page_rows(products, order_by, descending, fields, page)]
+        return numbered_page_response(
+            request, page, rows, fields, await afacet_buckets(products, facets), validators)
+
+    async def build_cursor_page(query):
+        products, order_by, descending, fields, facets = query
+        per_page = cursor_per_page(request.GET)
+        if per_page is None:
+            return invalid_per_page_response()
+        try:
+            rows, next_cursor = await acursor_page(products, order_by, descending,
+                                                   request.GET["cursor"], per_page,
+                                                   cursor_fields(fields[0]))
+        except InvalidCursor as e:
+            return JsonResponse({"cursor": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        total = await products.acount() if wants_meta(request.GET) else None
+        return cursor_page_response(
+            request, rows, next_cursor, fields, total, await afacet_buckets(products, facets))
+
+    return await cached_response(
+        request, await product_cache.alist_key(request.GET), build_response)
+
+
+@use_read_replica
+async def product_detail(request, pk):
+    """
+    Async version of ProductViewSet.retrieve
+    """
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+
+    async def build_response():
+        try:
+            row = await Product.objects.values_list(*PRODUCT_FIELDS).aget(pk=pk)
+        except Product.DoesNotExist:
+            return JsonResponse({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
+        etag, last_modified = row_validators(row)
+        not_modified = not_modified_response(request, etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+        return set_validators(json_response(encode_rows([row])[0]), etag, last_modified)
+
+    return await cached_response(request, product_cache.product_key(pk), build_response)
+
+
+async def product_export(request):
+    """
+    Async version of ProductViewSet.export
+    """
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+
+    export_format = request.GET.get("export_format", "ndjson")
+    if export_format not in EXPORT_FORMATS:
+        return invalid_export_format_response()
+    try:
+        products, order_by, descending = query_products(request.GET)
+    except InvalidFilter as e:
+        return JsonResponse(e.errors, status=status.HTTP_400_BAD_REQUEST)
+    if order_by not in ORDERABLE_FIELDS:
+        return invalid_order_by_response()
+    products = order_products(products, order_by, descending)
+
+    gzip = accepts_gzip(request)
+    chunks, content_type = export_stream(products, export_format, gzip)
+    async_chunks, content_type = aexport_stream(products, export_format, gzip)
+    response = AsyncStreamingHttpResponse(chunks, async_chunks, content_type=content_type)
+    return set_export_headers(response, export_format, gzip)
@@ -0,0 +1,182 @@
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from .models import Product
+from .search import build_search_value
+
+
+@contextmanager
+def benchmark_database(verbosity=0, name=None):
+    """
+    Runs the block against a throwaway test database,
+    so benchmarks never touch the real data.
+    SQLite test database is in memory, unless a file name is given.
+    Test environment is set up, so the test client can be used.
+    Requests are not throttled, since every benchmark client shares one address.
+    """
+    setup_test_environment()
+    unthrottled = override_settings(
+        REST_FRAMEWORK=dict(settings.REST_FRAMEWORK, DEFAULT_THROTTLE_RATES={}))
+    unthrottled.enable()
+    old_name = connection.settings_dict["NAME"]
+    old_test_name = connection.settings_dict["TEST"].get("NAME")
+    if name is not None:
+        connection.settings_dict["TEST"]["NAME"] = name
+    connection.creation.create_test_db(
+        verbosity=verbosity, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity)
+        connection.settings_dict["TEST"]["NAME"] = old_test_name
+        unthrottled.disable()
+        teardown_test_environment()
+
+
+def seed_products(count, start=0, batch_size=10000):
+    """
+    Inserts count synthetic products with bulk_create,
+    numbering them from start.
+    """
+    created = start
+    while created < start + count:
+        batch = []
+        for i in range(created, min(created + batch_size, start + count)):
+            name = "product {}".format(i)
+            price = Decimal(i % 100000) / 100
+            rating = (i % 501) / 100
+            batch.append(Product(
+                name=name, price=price, rating=rating,
+                search_value=build_search_value(name, price, rating)))
+        Product.objects.bulk_create(batch)
+        created += len(batch)
+
+
+def wsgi_request(handler, request):
+    """
+    Sends a RequestFactory request through a WSGIHandler like a WSGI server would,
+    so request_started and request_finished close connections by CONN_MAX_AGE.
+    Returns the response status code.
+    """
+    statuses = []
+    response = handler(request.environ, lambda status, headers: statuses.append(status))
+    response.close()
+    return int(statuses[0].split()[0])
+
+
+def measure(function, repeat):
+    """
+    Calls function repeat times and returns latency statistics in milliseconds.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - start) * 1000)
+    return dict({"repeat": repeat}, **latency_stats(timings))
+
+
+def latency_stats(timings):
+    """
+    Returns mean and percentiles of latencies in milliseconds.
+    """
+    timings = sorted(timings)
+    return {
+        "mean_ms": round(statistics.mean(timings), 3),
+        "p50_ms": round(percentile(timings, 50), 3),
+        "p95_ms": round(percentile(timings, 95), 3),
+        "p99_ms": round(percentile(timings, 99), 3),
+    }
+
+
+def run_load(send, requests, concurrency):
+    """
+    Calls send(i) for i in range(requests) from concurrency threads.
+    Returns throughput and latency statistics.
+    """
+    def timed(i):
+        start = time.perf_counter()
+        send(i)
+        return (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        timings = list(executor.map(timed, range(requests)))
+    return _load_result(timings, time.perf_counter() - start, concurrency)
+
+
+async def arun_load(send, requests, concurrency):
+    """
+    Awaits send(i) for i in range(requests), at most concurrency at a time.
+    Returns throughput and latency statistics.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def timed(i):
+        async with semaphore:
+            start = time.perf_counter()
+            await send(i)
+            return (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    timings = await asyncio.gather(*(timed(i) for i in range(requests)))
+    return _load_result(timings, time.perf_counter() - start, concurrency)
+
+
+def _load_result(timings, elapsed, concurrency):
+    return dict({
+        "requests": len(timings),
+        "concurrency": concurrency,
+        "throughput_rps": round(len(timings) / elapsed, 1),
+    }, **latency_stats(timings))
+
+
+def percentile(sorted_values, percent):
+    if not sorted_values:
+        return 0
+    index = min(len(sorted_values) - 1,
+                int(round(percent / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+# Metrics compared against a baseline, with True if higher values are worse
+COMPARED_METRICS = {
+    "throughput_rps": False,
+    "p50_ms": True,
+    "p95_ms": True,
+    "p99_ms": True,
+}
+
+
+def compare_results(baseline, current, threshold):
+    """
+    Returns descriptions of metrics in current results that regressed
+    by more than threshold (a fraction) against baseline.
+    Query counts may not grow at all.
+    """
+    regressions = []
+    for endpoint, base in baseline["endpoints"].items():
+        result = current["endpoints"].get(endpoint)
+        if result is None:
+            regressions.append("{}: missing".format(endpoint))
+            continue
+        for metric, higher_is_worse in COMPARED_METRICS.items():
+            old, new = base[metric], result[metric]
+            if higher_is_worse:
+                regressed = new > old * (1 + threshold)
+            else:
+                regressed = new < old * (1 - threshold)
+            if regressed:
+                regressions.append("{} {}: {} -> {}".format(endpoint, metric, old, new))
+        if result["queries_per_request"] > base["queries_per_request"]:
+            regressions.append("{} queries_per_request: {} -> {}".format(
+                endpoint, base["queries_per_request"], result["queries_per_request"]))
+    return regressions
@@ -0,0 +1,203 @@
+import hashlib
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+
+from .changes import changed_products
+from .pagination import wants_meta
+
+LIST_PARAMS = ["order_by", "order", "search", "page", "per_page", "cursor", "fields", "meta",
+               "price_min", "price_max", "rating_min", "updated_after", "facets"]
+
+
+class ProductCache:
+    """
+    Caches rendered product responses.
+    List responses are keyed on a catalog version, which every write bumps,
+    so all cached lists become unreachable at once.
+    Single products have their own keys, deleted when the product changes.
+    Writes of other processes, which invalidate only their own cache
+    when it is per process, are found by polling the change counter
+    every poll_interval seconds. Invalidations given the change number
+    of their write mark it as applied, so the poll skips it.
+    """
+
+    def __init__(self, alias=None, timeout=None, poll_interval=None):
+        self.alias = alias or getattr(
+            settings, "PRODUCTS_CACHE_ALIAS", "default")
+        self.timeout = timeout or getattr(
+            settings, "PRODUCTS_CACHE_TIMEOUT", 300)
+        self.poll_interval = poll_interval if poll_interval is not None else getattr(
+            settings, "PRODUCTS_CACHE_POLL_SECONDS", 1)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._polled = 0
+        self._change_seq = None
+        self._applied = set()
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def list_key(self, query):
+        return "products:list:{}:{}".format(self.catalog_version(), list_params_digest(query))
+
+    async def alist_key(self, query):
+        await self.apoll_changes()
+        version = await self.cache.aget_or_set("products:version", initial_version, timeout=None)
+        return "products:list:{}:{}".format(version, list_params_digest(query))
+
+    def product_key(self, pk):
+        return "products:product:{}".format(pk)
+
+    def get(self, key):
+        self.poll_changes()
+        value = self.cache.get(key)
+        self._count(value)
+        return value
+
+    async def aget(self, key):
+        await self.apoll_changes()
+        value = await self.cache.aget(key)
+        self._count(value)
+        return value
+
+    def set(self, key, value):
+        self.cache.set(key, value, self.timeout)
+
+    async def aset(self, key, value):
+        await self.cache.aset(key, value, self.timeout)
+
+    def invalidate_catalog(self, change_seq=None):
+        """
+        Makes every cached list response stale.
+        Returns the new catalog version.
+        """
+        if change_seq is not None:
+            with self._lock:
+                self._applied.add(change_seq)
+        try:
+            return self.cache.incr("products:version")
+        except ValueError:
+            version = initial_version()
+            self.cache.set("products:version", version, timeout=None)
+            return version
+
+    def invalidate_product(self, pk, change_seq=None):
+        """
+        Makes cached product and every cached list response stale.
+        Returns the new catalog version.
+        """
+        self.cache.delete(self.product_key(pk))
+        return self.invalidate_catalog(change_seq)
+
+    def invalidate_products(self, pks, change_seq=None):
+        """
+        Makes cached products and every cached list response stale.
+        Returns the new catalog version.
+        """
+        self.cache.delete_many([self.product_key(pk) for pk in pks])
+        return self.invalidate_catalog(change_seq)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0,
+            }
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def _count(self, value):
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+    def catalog_version(self):
+        self.poll_changes()
+        return self.cache.get_or_set("products:version", initial_version, timeout=None)
+
+    def poll_changes(self, force=False):
+        """
+        Makes products written since the last poll, and every cached list response,
+        stale if the change counter moved, at most once every poll_interval seconds.
+        Changes already applied by this process are skipped, so its own writes
+        do not invalidate twice, unless the poll reads them before they were applied.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._polled < self.poll_interval:
+                return
+            self._polled = now
+            seen = self._change_seq
+        change_seq, changes = changed_products(seen)
+        with self._lock:
+            self._change_seq = change_seq
+            applied = self._applied
+            self._applied = {seq for seq in applied if seq > change_seq}
+        pks = [pk for seq, pk in changes if seq not in applied]
+        if pks:
+            self.invalidate_products(pks)
+
+    def reset_polling(self):
+        with self._lock:
+            self._polled = 0
+            self._change_seq = None
+            self._applied = set()
+
+    async def apoll_changes(self):
+        if time.monotonic() - self._polled >= self.poll_interval:
+            await sync_to_async(self.poll_changes)()
+
+
+def initial_version():
+    """
+    Returns a catalog version for a missing version key.
+    Versions start from the current time, so a cleared or evicted key
+    never brings back a version used before.
+    """
+    return time.time_ns()
+
+
+def normalize_list_params(query):
+    """
+    Returns list query parameters in a canonical form,
+    so equivalent queries share a cache key.
+    """
+    search = query.get("search") or ""
+    fields = {name.strip() for name in (query.get("fields") or "").split(",") if name.strip()}
+    facets = {name.strip() for name in (query.get("facets") or "").split(",") if name.strip()}
+    params = {
+        "order_by": query.get("order_by") or "name",
+        "order": "dsc" if query.get("order") == "dsc" else "asc",
+        "search": search.lower() if search.strip() else "",
+        "page": query.get("page", "1"),
+        "per_page": query.get("per_page", "10"),
+        "cursor": query.get("cursor"),
+        "fields": ",".join(sorted(fields)),
+        "meta": wants_meta(query),
+        "price_min": (query.get("price_min") or "").strip(),
+        "price_max": (query.get("price_max") or "").strip(),
+        "rating_min": (query.get("rating_min") or "").strip(),
+        "updated_after": (query.get("updated_after") or "").strip(),
+        "facets": ",".join(sorted(facets)),
+    }
+    return tuple((name, params[name]) for name in LIST_PARAMS)
+
+
+def list_params_digest(query):
+    return hashlib.md5(repr(normalize_list_params(query)).encode()).hexdigest()
+
+
+product_cache = ProductCache()
@@ -0,0 +1,114 @@
+from django.db import router, transaction
+from django.db.models import F, Q
+
+from .encoders import PRODUCT_FIELDS, encode_rows
+from .models import ChangeCounter, Product, ProductTombstone
+
+MAX_CHANGES_PER_PAGE = 1000
+
+
+class InvalidWatermark(Exception):
+    pass
+
+
+def next_change():
+    """
+    Returns a new change number for products written by the current transaction.
+    It must be called inside that transaction: updating the counter holds
+    the SQLite write lock until commit, so change numbers are committed in order
+    and a reader never sees a change numbered below one it has already seen.
+    """
+    db = router.db_for_write(ChangeCounter)
+    counter = ChangeCounter.objects.using(db)
+    if not counter.filter(pk=1).update(value=F("value") + 1):
+        counter.create(pk=1, value=1)
+    return counter.values_list("value", flat=True).get(pk=1)
+
+
+def last_change():
+    """
+    Returns the number of the last committed change, 0 before the first one.
+    """
+    return ChangeCounter.objects.filter(pk=1).values_list("value", flat=True).first() or 0
+
+
+def current_watermark():
+    """
+    Returns a watermark before the last committed change, so reading changes
+    from it never misses a write that was not visible when it was taken.
+    """
+    return encode_watermark(last_change(), 0)
+
+
+def changed_products(change_seq):
+    """
+    Returns (last change number, (change number, id) of products written or deleted
+    after change_seq), read from one snapshot with the (change_seq, id) indexes.
+    No changes are read for a change_seq of None.
+    """
+    with transaction.atomic(using=router.db_for_read(Product)):
+        last = last_change()
+        if change_seq is None or change_seq == last:
+            return last, []
+        changes = list(Product.objects.filter(
+            change_seq__gt=change_seq).values_list("change_seq", "id"))
+        changes += ProductTombstone.objects.filter(
+            change_seq__gt=change_seq).values_list("change_seq", "product_id")
+    return last, changes
+
+
+def encode_watermark(change_seq, pk):
+    return "{}-{}".format(change_seq, pk)
+
+
+def decode_watermark(watermark):
+    """
+    Returns (change number, id) of a watermark, or (0, 0) for an empty one.
+    """
+    if not watermark:
+        return 0, 0
+    try:
+        change_seq, pk = (int(part) for part in watermark.split("-"))
+    except ValueError:
+        raise InvalidWatermark("invalid watermark")
+    return change_seq, pk
+
+
+def changes_page(watermark, per_page):
+    """
+    Returns products written and deleted after the watermark, in the order
+    they were written, with at most per_page changes.
+    Products are read with the (change_seq, id) index,
+    so a page costs O(per_page) whatever the size of the catalog.
+    Products and tombstones are read in one transaction, so from one snapshot:
+    a write committed between the two reads would otherwise be skipped
+    by a watermark moved past it by the other read.
+    Returns (changes, next watermark, has more).
+    """
+    change_seq, pk = decode_watermark(watermark)
+    with transaction.atomic(using=router.db_for_read(Product)):
+        products = list(_after(Product.objects.all(), "id", change_seq, pk)
+                        .values_list("change_seq", *PRODUCT_FIELDS)[:per_page + 1])
+        tombstones = list(_after(ProductTombstone.objects.all(), "product_id", change_seq, pk)
+                          .values_list("change_seq", "product_id")[:per_page + 1])
+    merged = sorted(
+        [(row[0], row[1], row[1:]) for row in products] +
+        [(seq, product_id, None) for seq, product_id in tombstones],
+        key=lambda change: change[:2])
+    page = merged[:per_page]
+
+    encoded = iter(encode_rows([row for _, _, row in page if row is not None]))
+    changes = [{"id": product_id, "deleted": True} if row is None else next(encoded)
+               for _, product_id, row in page]
+    if page:
+        watermark = encode_watermark(page[-1][0], page[-1][1])
+    else:
+        watermark = encode_watermark(change_seq, pk)
+    return changes, watermark, len(merged) > per_page
+
+
+def _after(queryset, id_field, change_seq, pk):
+    # Leading range lets SQLite search the (change_seq, id) index instead of scanning it
+    return (queryset.filter(change_seq__gte=change_seq)
+            .filter(Q(change_seq__gt=change_seq) | Q(change_seq=change_seq, **{id_field + "__gt": pk}))
+            .order_by("change_seq", id_field))
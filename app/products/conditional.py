@@ -0,0 +1,93 @@
+import calendar
+import hashlib
+
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date
+
+from .cache import list_params_digest
+from .encoders import PRODUCT_FIELDS
+
+
+def product_validators(pk, updated_at):
+    """
+    Returns (ETag, Last-Modified timestamp) of a single product.
+    """
+    return '"{}-{}"'.format(pk, _version(updated_at)), calendar.timegm(updated_at.utctimetuple())
+
+
+def list_validators(query, count, last_updated):
+    """
+    Returns (ETag, None) of a list page, built from its query parameters
+    and the (count, max updated_at) watermark of the filtered products.
+    List pages have no Last-Modified, because deleting a product
+    does not move max updated_at, but it does change the count.
+    """
+    version = _version(last_updated) if last_updated else 0
+    return '"{}-{}-{}"'.format(list_params_digest(query)[:16], count, version), None
+
+
+def page_validators(query, rows, fields=PRODUCT_FIELDS, extra=None):
+    """
+    Returns (ETag, None) of a list page, built from its query parameters
+    and id and updated_at of every product on the page.
+    Extra data of the page, like a total count, is added to the ETag as well.
+    """
+    id_index, updated_at_index = fields.index("id"), fields.index("updated_at")
+    versions = ";".join("{}-{}".format(row[id_index], _version(row[updated_at_index]))
+                        for row in rows)
+    if extra is not None:
+        versions += repr(extra)
+    digest = hashlib.md5(versions.encode()).hexdigest()
+    return '"{}-{}"'.format(list_params_digest(query)[:16], digest[:16]), None
+
+
+def row_validators(row, fields=PRODUCT_FIELDS):
+    """
+    Returns (ETag, Last-Modified timestamp) of a product value tuple.
+    """
+    return product_validators(row[fields.index("id")], row[fields.index("updated_at")])
+
+
+def not_modified_response(request, etag, last_modified):
+    """
+    Returns 304 (or 412) response if request preconditions match
+    the validators, otherwise None.
+    """
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
+
+
+def set_validators(response, etag, last_modified):
+    response["ETag"] = etag
+    if last_modified is not None:
+        response["Last-Modified"] = http_date(last_modified)
+    return response
+
+
+def cache_entry(response):
+    """
+    Returns cacheable (content, ETag, Last-Modified timestamp) of a response.
+    """
+    last_modified = response.get("Last-Modified")
+    if last_modified is not None:
+        last_modified = parse_http_date(last_modified)
+    return response.content, response.get("ETag"), last_modified
+
+
+def cached_entry_response(request, entry):
+    """
+    Returns response for a cached entry, or 304 if it did not change.
+    """
+    content, etag, last_modified = entry
+    not_modified = not_modified_response(request, etag, last_modified)
+    if not_modified is not None:
+        return not_modified
+    return set_validators(
+        HttpResponse(content, content_type="application/json"), etag, last_modified)
+
+
+def _version(updated_at):
+    return updated_at.strftime("%Y%m%d%H%M%S%f")
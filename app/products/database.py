@@ -0,0 +1,78 @@
+import asyncio
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import connections
+
+READ_REPLICA_ALIAS = "replica"
+
+_use_read_replica = ContextVar("products_use_read_replica", default=False)
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    """
+    Runs SQLITE_PRAGMAS of the current DATABASE_PROFILE on every new SQLite connection.
+    Read replica connections are made read-only.
+    """
+    if connection.vendor != "sqlite":
+        return
+    pragmas = dict(settings.SQLITE_PRAGMAS.get(settings.DATABASE_PROFILE, {}))
+    if connection.alias == READ_REPLICA_ALIAS:
+        pragmas.pop("journal_mode", None)
+        pragmas["query_only"] = "on"
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute("PRAGMA {} = {}".format(name, value))
+
+
+@contextmanager
+def read_replica():
+    """
+    Sends reads in the block to the read replica, if one is configured.
+    """
+    token = _use_read_replica.set(True)
+    try:
+        yield
+    finally:
+        _use_read_replica.reset(token)
+
+
+def use_read_replica(view):
+    """
+    Decorates a view, sync or async, so its reads go to the read replica.
+    """
+    if asyncio.iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(*args, **kwargs):
+            with read_replica():
+                return await view(*args, **kwargs)
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        with read_replica():
+            return view(*args, **kwargs)
+    return wrapper
+
+
+class ReadReplicaRouter:
+    """
+    Routes reads inside read_replica() to the read replica database,
+    when it is configured. Everything else uses the default database.
+    """
+
+    def db_for_read(self, model, **hints):
+        if _use_read_replica.get() and READ_REPLICA_ALIAS in connections.databases:
+            return READ_REPLICA_ALIAS
+        return None
+
+    def db_for_write(self, model, **hints):
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db != READ_REPLICA_ALIAS
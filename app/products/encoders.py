@@ -0,0 +1,80 @@
+import json
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .metrics import timed_serialization
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+PRODUCT_FIELDS = ("id", "name", "price", "rating", "bayesian_rating", "decayed_rating", "updated_at")
+
+
+def _decimal(value):
+    return "{:f}".format(value)
+
+
+def _datetime(value):
+    value = value.isoformat()
+    if value.endswith("+00:00"):
+        value = value[:-6] + "Z"
+    return value
+
+
+FIELD_CONVERTERS = {
+    "id": None,
+    "name": None,
+    "price": _decimal,
+    "rating": float,
+    "bayesian_rating": float,
+    "decayed_rating": float,
+    "updated_at": _datetime,
+}
+
+
+@lru_cache(maxsize=None)
+def compile_row_encoder(fields=PRODUCT_FIELDS, output=None):
+    """
+    Returns function converting a value tuple of given fields to a dict
+    equal to ProductSerializer data of the same product.
+    If output is given, only those fields are in the dict.
+    """
+    columns = tuple(
+        (index, name, FIELD_CONVERTERS[name]) for index, name in enumerate(fields)
+        if output is None or name in output)
+
+    def encode_row(row):
+        return {
+            name: row[index] if convert is None else convert(row[index])
+            for index, name, convert in columns
+        }
+    return encode_row
+
+
+def encode_rows(rows, fields=PRODUCT_FIELDS, output=None):
+    """
+    Converts value tuples of given fields to dicts equal to ProductSerializer data,
+    limited to output fields, if they are given.
+    """
+    encode_row = compile_row_encoder(fields, output)
+    with timed_serialization():
+        return [encode_row(row) for row in rows]
+
+
+def use_orjson():
+    return orjson is not None and getattr(settings, "PRODUCTS_USE_ORJSON", True)
+
+
+def dumps(data):
+    """
+    Encodes data to JSON bytes.
+    Uses orjson if it is installed and enabled,
+    otherwise output is the same as JsonResponse.
+    """
+    if use_orjson():
+        return orjson.dumps(data)
+    return json.dumps(data, cls=DjangoJSONEncoder).encode()
@@ -0,0 +1,115 @@
+import csv
+import io
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+
+from django.utils.text import compress_sequence
+
+from .encoders import PRODUCT_FIELDS, compile_row_encoder, dumps
+from .streaming import acompress_sequence
+
+EXPORT_FIELDS = PRODUCT_FIELDS
+CHUNK_SIZE = 2000
+
+
+def iter_row_chunks(queryset, chunk_size=CHUNK_SIZE):
+    """
+    Yields lists of product value tuples.
+    Rows are fetched with a server side iterator, so memory stays flat.
+    """
+    chunk = []
+    for row in queryset.values_list(*EXPORT_FIELDS).iterator(chunk_size=chunk_size):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+async def aiter_row_chunks(queryset, chunk_size=CHUNK_SIZE):
+    """
+    Async version of iter_row_chunks.
+    Each chunk is fetched in a worker thread, like QuerySet.aiterator does,
+    because aiterator of values_list queries in Django 4.1 runs the query
+    inside the event loop.
+    """
+    rows = queryset.values_list(*EXPORT_FIELDS).iterator(chunk_size=chunk_size)
+    next_chunk = sync_to_async(lambda: list(islice(rows, chunk_size)))
+    while True:
+        chunk = await next_chunk()
+        if chunk:
+            yield chunk
+        if len(chunk) < chunk_size:
+            return
+
+
+def ndjson_encoder():
+    """
+    Returns (header, function encoding a chunk of rows) for NDJSON.
+    """
+    encode_row = compile_row_encoder(EXPORT_FIELDS)
+
+    def encode(chunk):
+        return b"".join(dumps(encode_row(row)) + b"\n" for row in chunk)
+    return b"", encode
+
+
+def csv_encoder():
+    """
+    Returns (header, function encoding a chunk of rows) for CSV.
+    """
+    encode_row = compile_row_encoder(EXPORT_FIELDS)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def encode(rows):
+        writer.writerows(rows)
+        value = buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+        return value
+    header = encode([EXPORT_FIELDS])
+    return header, lambda chunk: encode(encode_row(row).values() for row in chunk)
+
+
+EXPORT_FORMATS = {
+    "ndjson": (ndjson_encoder, "application/x-ndjson"),
+    "csv": (csv_encoder, "text/csv"),
+}
+
+
+def export_stream(queryset, export_format, gzip=False):
+    """
+    Returns (byte chunks, content type) of products in given format,
+    compressed with gzip on the fly if requested.
+    """
+    encoder, content_type = EXPORT_FORMATS[export_format]
+    header, encode = encoder()
+
+    def chunks():
+        yield header
+        for chunk in iter_row_chunks(queryset):
+            yield encode(chunk)
+
+    if gzip:
+        return compress_sequence(chunks()), content_type
+    return chunks(), content_type
+
+
+def aexport_stream(queryset, export_format, gzip=False):
+    """
+    Async version of export_stream, returning async iterator of byte chunks.
+    """
+    encoder, content_type = EXPORT_FORMATS[export_format]
+    header, encode = encoder()
+
+    async def chunks():
+        yield header
+        async for chunk in aiter_row_chunks(queryset):
+            yield encode(chunk)
+
+    if gzip:
+        return acompress_sequence(chunks()), content_type
+    return chunks(), content_type
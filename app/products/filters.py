@@ -0,0 +1,135 @@
+import math
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Case, Count, IntegerField, Value, When
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+# Query parameter: (field, lookup), each field has a (field, id) index
+FILTERS = {
+    "price_min": ("price", "gte"),
+    "price_max": ("price", "lte"),
+    "rating_min": ("rating", "gte"),
+    "updated_after": ("updated_at", "gt"),
+}
+
+# Bucket edges of facet histograms, the last bucket has no upper bound
+FACETS = {
+    "price": [10, 50, 100, 500, 1000],
+    "rating": [1, 2, 3, 4],
+}
+
+
+class InvalidFilter(Exception):
+    def __init__(self, errors):
+        super().__init__(errors)
+        self.errors = errors
+
+
+def _decimal(value):
+    value = Decimal(value)
+    if not value.is_finite():
+        raise ValueError(value)
+    return value
+
+
+def _float(value):
+    value = float(value)
+    if not math.isfinite(value):
+        raise ValueError(value)
+    return value
+
+
+def _datetime(value):
+    value = parse_datetime(value)
+    if value is None:
+        raise ValueError(value)
+    if timezone.is_aware(value):
+        value = timezone.make_naive(value)
+    return value
+
+
+PARSERS = {"price": _decimal, "rating": _float, "updated_at": _datetime}
+
+
+def has_filters(params):
+    return any(params.get(name) for name in FILTERS)
+
+
+def filter_products(queryset, params):
+    """
+    Filters products by range parameters of a list query.
+    Raises InvalidFilter with errors of every invalid parameter.
+    """
+    lookups = {}
+    errors = {}
+    for name, (field, lookup) in FILTERS.items():
+        value = (params.get(name) or "").strip()
+        if not value:
+            continue
+        try:
+            lookups["{}__{}".format(field, lookup)] = PARSERS[field](value)
+        except (ValueError, InvalidOperation):
+            errors[name] = "must be a valid {}".format(
+                "date and time" if field == "updated_at" else "number")
+    if errors:
+        raise InvalidFilter(errors)
+    return queryset.filter(**lookups)
+
+
+def facet_names(params):
+    """
+    Returns facets requested by ?facets= of a list query,
+    or None if it names an unknown facet.
+    """
+    names = sorted({name.strip() for name in params.get("facets", "").split(",") if name.strip()})
+    if not set(names) <= set(FACETS):
+        return None
+    return names
+
+
+def facet_buckets(queryset, names):
+    """
+    Returns {facet: [{"min", "max", "count"}]} histograms of products,
+    counted by one query grouped by the bucket of every facet.
+    """
+    if not names:
+        return {}
+    return _histograms(names, _facet_rows(queryset, names))
+
+
+async def afacet_buckets(queryset, names):
+    """
+    Async version of facet_buckets.
+    """
+    if not names:
+        return {}
+    return _histograms(names, [row async for row in _facet_rows(queryset, names)])
+
+
+def _facet_rows(queryset, names):
+    bucket_fields = ["{}_bucket".format(name) for name in names]
+    return (queryset.order_by()
+            .annotate(**{field: _bucket(name) for field, name in zip(bucket_fields, names)})
+            .values(*bucket_fields)
+            .annotate(count=Count("id"))
+            .values_list(*bucket_fields, "count"))
+
+
+def _histograms(names, rows):
+    counts = {name: [0] * (len(FACETS[name]) + 1) for name in names}
+    for row in rows:
+        for name, bucket in zip(names, row):
+            counts[name][bucket] += row[-1]
+    return {
+        name: [{"min": low, "max": high, "count": count} for low, high, count in
+               zip([0] + FACETS[name], FACETS[name] + [None], counts[name])]
+        for name in names
+    }
+
+
+def _bucket(name):
+    edges = FACETS[name]
+    return Case(
+        *[When(**{"{}__lt".format(name): edge}, then=Value(i)) for i, edge in enumerate(edges)],
+        default=Value(len(edges)), output_field=IntegerField())
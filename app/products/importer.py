@@ -0,0 +1,121 @@
+import csv
+import json
+
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+from .cache import product_cache
+from .changes import next_change
+from .models import Product
+from .search import build_search_value
+from .serializers import ProductImportSerializer
+
+BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+
+def iter_stream_lines(stream, encoding="utf-8"):
+    """
+    Yields decoded lines of a binary stream, one at a time.
+    A missing stream, which is what an empty request body has, yields nothing.
+    """
+    if stream is None:
+        return
+    for line in iter(stream.readline, b""):
+        yield line.decode(encoding, errors="replace")
+
+
+def read_ndjson(lines):
+    """
+    Yields (row_number, data, error) for every non-empty line of NDJSON.
+    """
+    for row_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError:
+            yield row_number, None, "invalid JSON"
+            continue
+        if not isinstance(data, dict):
+            yield row_number, None, "expected JSON object"
+            continue
+        yield row_number, data, None
+
+
+def read_csv(lines):
+    """
+    Yields (row_number, data, error) for every row of CSV with a header.
+    """
+    reader = csv.DictReader(lines)
+    for data in reader:
+        yield reader.line_num, data, None
+
+
+def import_products(rows, batch_size=BATCH_SIZE):
+    """
+    Validates rows and upserts them on product name.
+    Each batch is written in its own transaction, so an invalid row
+    or a failed batch does not abort the rest of the import.
+    Rows repeating a name of the same batch update the product of the earlier row,
+    so they are counted as updated and every row is counted once.
+    Returns counts of created, updated and failed rows with row errors.
+    """
+    result = {"created": 0, "updated": 0, "failed": 0, "errors": []}
+    batch = {}
+    for row_number, data, error in rows:
+        if error is None:
+            serializer = ProductImportSerializer(data=data)
+            if serializer.is_valid():
+                name = serializer.validated_data["name"]
+                row_numbers = batch[name][0] if name in batch else []
+                batch[name] = (row_numbers + [row_number], serializer.validated_data["price"])
+            else:
+                error = serializer.errors
+        if error is not None:
+            _add_error(result, row_number, error)
+        if len(batch) >= batch_size:
+            _upsert_batch(batch, result)
+            batch = {}
+    if batch:
+        _upsert_batch(batch, result)
+    return result
+
+
+def _upsert_batch(batch, result):
+    try:
+        with transaction.atomic():
+            existing = {
+                name: (product_id, rating) for name, product_id, rating in
+                Product.objects.filter(name__in=batch.keys())
+                .values_list("name", "id", "rating")
+            }
+            now = timezone.now()
+            change_seq = next_change()
+            products = []
+            for name, (row_numbers, price) in batch.items():
+                rating = existing.get(name, (None, 0))[1]
+                products.append(Product(
+                    name=name, price=price, updated_at=now, change_seq=change_seq,
+                    search_value=build_search_value(name, price, rating)))
+            Product.objects.bulk_create(
+                products, update_conflicts=True, unique_fields=["name"],
+                update_fields=["price", "updated_at", "change_seq", "search_value"])
+    except DatabaseError as e:
+        for row_numbers, price in batch.values():
+            for row_number in row_numbers:
+                _add_error(result, row_number, str(e))
+        return
+    rows = sum(len(row_numbers) for row_numbers, price in batch.values())
+    result["created"] += len(batch) - len(existing)
+    result["updated"] += rows - (len(batch) - len(existing))
+    product_cache.invalidate_products(
+        [product_id for product_id, rating in existing.values()], change_seq)
+
+
+def _add_error(result, row_number, error):
+    result["failed"] += 1
+    if len(result["errors"]) < MAX_REPORTED_ERRORS:
+        if not isinstance(error, dict):
+            error = {"non_field_errors": [error]}
+        result["errors"].append({"row": row_number, "errors": error})
@@ -0,0 +1,113 @@
+import json
+import os
+import tempfile
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from rest_framework.authtoken.models import Token
+
+from products.bench import benchmark_database, compare_results, run_load, seed_products
+from products.metrics import registry
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = "Benchmarks products API endpoints on a synthetic catalog"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=10000)
+        parser.add_argument("--users", type=int, default=100)
+        parser.add_argument("--requests", type=int, default=500)
+        parser.add_argument("--register-requests", type=int, default=10,
+                            help="Requests to register/, which hashes passwords")
+        parser.add_argument("--concurrency", type=int, default=1)
+        parser.add_argument("--output", help="Write results to this file")
+        parser.add_argument("--compare", help="Fail if results regress against this baseline file")
+        parser.add_argument("--threshold", type=float, default=0.2,
+                            help="Allowed regression as a fraction, 0.2 by default")
+
+    def handle(self, *args, **options):
+        if options["requests"] > options["products"] * options["users"]:
+            raise CommandError("requests can not exceed products * users, "
+                               "every rating needs a new (user, product) pair")
+
+        # Concurrent threads need a database file, the in-memory one locks whole tables
+        with tempfile.TemporaryDirectory() as directory, \
+                benchmark_database(name=os.path.join(directory, "bench_api.sqlite3")):
+            results = {
+                "config": {name: options[name] for name in
+                           ["products", "users", "requests", "register_requests", "concurrency"]},
+                "endpoints": self._run(options),
+            }
+
+        output = json.dumps(results, indent=2)
+        self.stdout.write(output)
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                f.write(output)
+        if options["compare"]:
+            with open(options["compare"]) as f:
+                baseline = json.load(f)
+            regressions = compare_results(baseline, results, options["threshold"])
+            if regressions:
+                raise CommandError("Performance regressed:\n" + "\n".join(regressions))
+            self.stderr.write("No regressions against {}".format(options["compare"]))
+
+    def _run(self, options):
+        seed_products(options["products"])
+        User.objects.bulk_create(
+            User(username="bench_user_{}".format(i)) for i in range(options["users"]))
+        tokens = list(Token.objects.bulk_create(
+            Token(user=user, key=Token.generate_key()) for user in User.objects.all()))
+        product_ids = list(Product.objects.order_by("id").values_list("id", flat=True))
+        requests = options["requests"]
+
+        def list_products(i):
+            return Client().get("/products/", {
+                "order_by": ["name", "price", "rating", "updated_at"][i % 4],
+                "page": i % 100 + 1,
+            })
+
+        def retrieve(i):
+            return Client().get("/products/{}/".format(product_ids[i % len(product_ids)]))
+
+        def rate_product(i):
+            token = tokens[i % len(tokens)]
+            product_id = product_ids[i // len(tokens)]
+            return Client().post(
+                "/products/{}/rate-product/".format(product_id), {"value": i % 6},
+                HTTP_AUTHORIZATION="Token {}".format(token.key))
+
+        def user_create(i):
+            return Client().post("/register/", {
+                "username": "registered_{}".format(i), "password": "bench password"})
+
+        scenarios = [
+            ("list", "products-list", list_products, requests),
+            ("retrieve", "products-detail", retrieve, requests),
+            ("rate_product", "products-rate-product", rate_product, requests),
+            ("user_create", "products.views.user_create", user_create,
+             options["register_requests"]),
+        ]
+        endpoints = {}
+        for name, view_name, send, count in scenarios:
+            errors = []
+
+            def checked_send(i, send=send, errors=errors):
+                try:
+                    response = send(i)
+                except Exception as e:
+                    errors.append(type(e).__name__)
+                    return
+                if response.status_code >= 400:
+                    errors.append(response.status_code)
+
+            registry.reset()
+            result = run_load(checked_send, count, options["concurrency"])
+            method = "GET" if name in ("list", "retrieve") else "POST"
+            queries = registry.summary("db_queries", view_name, method)
+            result["queries_per_request"] = round(queries.sum / queries.count, 2) if queries else 0
+            result["errors"] = len(errors)
+            endpoints[name] = result
+        return endpoints
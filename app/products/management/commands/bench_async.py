@@ -0,0 +1,76 @@
+import asyncio
+import json
+import urllib.error
+import urllib.request
+
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, Client
+
+from products.bench import arun_load, benchmark_database, run_load, seed_products
+
+# Pages and ids are cycled, so most requests miss the response cache
+ENDPOINTS = {
+    "list": ("/products/?order_by=price&per_page=20&page={page}",
+             "/async/products/?order_by=price&per_page=20&page={page}"),
+    "retrieve": ("/products/{id}/", "/async/products/{id}/"),
+    "export": ("/products/export/?search=product+1", "/async/products/export/?search=product+1"),
+}
+
+
+class Command(BaseCommand):
+    help = "Compares sync and async read endpoints under concurrent load"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=10000)
+        parser.add_argument("--requests", type=int, default=500)
+        parser.add_argument("--concurrency", type=int, default=16)
+        parser.add_argument("--url", help="Base url of a running server, e.g. http://localhost:8000. "
+                            "By default requests are sent in-process to a synthetic catalog.")
+
+    def handle(self, *args, **options):
+        if options["url"]:
+            results = self._bench_server(options)
+        else:
+            with benchmark_database():
+                seed_products(options["products"])
+                results = self._bench_in_process(options)
+        self.stdout.write(json.dumps(results, indent=2))
+
+    def _bench_in_process(self, options):
+        results = {}
+        for name, (sync_path, async_path) in ENDPOINTS.items():
+            def send(i, path=sync_path):
+                response = Client().get(self._path(path, i, options))
+                if response.streaming:
+                    b"".join(response.streaming_content)
+
+            async def asend(i, path=async_path):
+                response = await AsyncClient().get(self._path(path, i, options))
+                if response.streaming:
+                    [chunk async for chunk in response.async_streaming_content]
+
+            results[name] = {
+                "sync": run_load(send, options["requests"], options["concurrency"]),
+                "async": asyncio.run(
+                    arun_load(asend, options["requests"], options["concurrency"])),
+            }
+        return results
+
+    def _bench_server(self, options):
+        results = {}
+        for name, (sync_path, async_path) in ENDPOINTS.items():
+            results[name] = {}
+            for mode, path in [("sync", sync_path), ("async", async_path)]:
+                def send(i, path=path):
+                    url = options["url"].rstrip("/") + self._path(path, i, options)
+                    try:
+                        with urllib.request.urlopen(url) as response:
+                            response.read()
+                    except urllib.error.HTTPError as e:
+                        e.read()
+
+                results[name][mode] = run_load(send, options["requests"], options["concurrency"])
+        return results
+
+    def _path(self, path, i, options):
+        return path.format(id=i % options["products"] + 1, page=i % 50 + 1)
@@ -0,0 +1,47 @@
+import json
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+
+from products.authentication import token_cache
+from products.bench import benchmark_database, measure, seed_products
+
+
+class Command(BaseCommand):
+    help = "Compares authenticated request latency with and without the token cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=100)
+        parser.add_argument("--repeat", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        with benchmark_database():
+            seed_products(10)
+            User.objects.bulk_create(
+                User(username="user {}".format(i)) for i in range(options["users"]))
+            tokens = [Token.objects.create(user=user).key for user in User.objects.all()]
+            client = Client()
+
+            def send():
+                send.calls += 1
+                token = tokens[send.calls % len(tokens)]
+                client.get("/products/1/", HTTP_AUTHORIZATION="Token {}".format(token))
+            send.calls = 0
+
+            max_size = token_cache.max_size
+            results = {}
+            for mode, size in [("uncached", 0), ("cached", max_size)]:
+                token_cache.max_size = size
+                token_cache.clear()
+                token_cache.reset_stats()
+                send()
+                with CaptureQueriesContext(connection) as queries:
+                    results[mode] = measure(send, options["repeat"])
+                results[mode]["queries_per_request"] = len(queries) / options["repeat"]
+                results[mode]["token_cache"] = token_cache.stats()
+            token_cache.max_size = max_size
+        self.stdout.write(json.dumps(results, indent=2))
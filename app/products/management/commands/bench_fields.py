@@ -0,0 +1,43 @@
+import json
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.test import Client
+
+from products.bench import benchmark_database, measure, seed_products
+
+
+class Command(BaseCommand):
+    help = "Compares payload size and latency of full and sparse product list pages"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=100000)
+        parser.add_argument("--per-page", nargs="+", type=int, default=[100, 1000])
+        parser.add_argument("--fields", default="id,name,price")
+        parser.add_argument("--repeat", type=int, default=100)
+
+    def handle(self, *args, **options):
+        results = []
+        with benchmark_database():
+            seed_products(options["products"])
+            client = Client()
+            for per_page in sorted(set(options["per_page"])):
+                result = {"per_page": per_page}
+                for mode, fields in [("all", None), ("sparse", options["fields"])]:
+                    params = {"per_page": per_page, "order_by": "name"}
+                    if fields:
+                        params["fields"] = fields
+
+                    def send():
+                        # Every page is a response cache miss
+                        cache.clear()
+                        send.calls += 1
+                        return client.get("/products/", dict(params, page=send.calls % 50 + 1))
+                    send.calls = 0
+
+                    result[mode] = measure(send, options["repeat"])
+                    result[mode]["bytes"] = len(send().content)
+                result["bytes_saved"] = round(1 - result["sparse"]["bytes"] / result["all"]["bytes"], 3)
+                result["p50_saved"] = round(1 - result["sparse"]["p50_ms"] / result["all"]["p50_ms"], 3)
+                results.append(result)
+        self.stdout.write(json.dumps(results, indent=2))
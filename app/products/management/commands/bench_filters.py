@@ -0,0 +1,65 @@
+import json
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.test import Client
+
+from products.bench import benchmark_database, measure, seed_products
+from products.filters import filter_products
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = "Compares range filtered listing with pulling every page and filtering on the client"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=1000000)
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--price-min", default="100")
+        parser.add_argument("--price-max", default="120")
+        parser.add_argument("--rating-min", default="4")
+
+    def handle(self, *args, **options):
+        filters = {
+            "price_min": options["price_min"],
+            "price_max": options["price_max"],
+            "rating_min": options["rating_min"],
+        }
+        with benchmark_database():
+            seed_products(options["products"])
+            client = Client()
+
+            def get(params):
+                # Every request is a cache miss
+                cache.clear()
+                return client.get("/products/", params)
+
+            def client_side(enough=None):
+                matches = []
+                params = {"cursor": "", "per_page": 1000}
+                while params["cursor"] is not None and (enough is None or len(matches) < enough):
+                    data = get(params).json()
+                    matches += [p for p in data["products"] if self._matches(p, filters)]
+                    params["cursor"] = data["next_cursor"]
+                return matches
+
+            results = {
+                "products": options["products"],
+                "filters": filters,
+                "matches": filter_products(Product.objects.all(), filters).count(),
+                "plan": filter_products(Product.objects.all(), filters).order_by("name").explain(),
+                "filtered": measure(lambda: get(filters), options["repeat"]),
+                "filtered_with_facets": measure(
+                    lambda: get(dict(filters, facets="price,rating")), options["repeat"]),
+                "facets_only": measure(
+                    lambda: get({"facets": "price,rating", "per_page": 1}), options["repeat"]),
+                # What clients do today: pull pages and filter them, every page for counts
+                "client_side_first_page": measure(lambda: client_side(enough=10), options["repeat"]),
+                "client_side_full_scan": measure(client_side, 1),
+            }
+        self.stdout.write(json.dumps(results, indent=2))
+
+    def _matches(self, product, filters):
+        return (Decimal(filters["price_min"]) <= Decimal(product["price"]) <= Decimal(filters["price_max"])
+                and product["rating"] >= float(filters["rating_min"]))
@@ -0,0 +1,46 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.test import Client
+
+from products.bench import benchmark_database, measure, seed_products
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = "Benchmarks product search latency on synthetic catalogs"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", nargs="+", type=int,
+                            default=[10000, 100000, 1000000])
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--search", default="product 99")
+        parser.add_argument("--legacy", action="store_true",
+                            help="Also measure the old Python-side filter")
+
+    def handle(self, *args, **options):
+        results = []
+        with benchmark_database():
+            client = Client()
+            seeded = 0
+            for size in sorted(set(options["sizes"])):
+                seed_products(size - seeded, start=seeded)
+                seeded = size
+                params = {"search": options["search"], "per_page": 10}
+                result = {
+                    "products": size,
+                    "database": measure(
+                        lambda: client.get("/products/", params), options["repeat"]),
+                }
+                if options["legacy"]:
+                    result["legacy"] = measure(
+                        lambda: self._legacy_search(options["search"]), options["repeat"])
+                results.append(result)
+                self.stderr.write("{} products done".format(size))
+        self.stdout.write(json.dumps(results, indent=2))
+
+    def _legacy_search(self, search_word):
+        return list(filter(
+            lambda p: search_word.lower() in p._search_value().lower(),
+            Product.objects.order_by("name")
+        ))[:10]
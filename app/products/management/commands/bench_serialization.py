@@ -0,0 +1,48 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.http import JsonResponse
+from django.test.utils import override_settings
+
+from products.bench import benchmark_database, measure, seed_products
+from products.encoders import PRODUCT_FIELDS, compile_row_encoder, dumps, orjson
+from products.models import Product
+from products.serializers import ProductSerializer
+
+
+class Command(BaseCommand):
+    help = "Compares ProductSerializer with the fast serialization path"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", nargs="+", type=int, default=[10, 100, 1000])
+        parser.add_argument("--repeat", type=int, default=200)
+
+    def handle(self, *args, **options):
+        results = []
+        with benchmark_database():
+            seed_products(max(options["rows"]))
+            for rows in sorted(set(options["rows"])):
+                products = Product.objects.order_by("id")[:rows]
+                result = {
+                    "rows": rows,
+                    "serializer": measure(
+                        lambda: self._serializer(products), options["repeat"]),
+                }
+                with override_settings(PRODUCTS_USE_ORJSON=False):
+                    result["fast_json"] = measure(
+                        lambda: self._fast(products), options["repeat"])
+                if orjson is not None:
+                    with override_settings(PRODUCTS_USE_ORJSON=True):
+                        result["fast_orjson"] = measure(
+                            lambda: self._fast(products), options["repeat"])
+                results.append(result)
+        self.stdout.write(json.dumps(results, indent=2))
+
+    def _serializer(self, products):
+        return JsonResponse(
+            {"products": ProductSerializer(products.all(), many=True).data}).content
+
+    def _fast(self, products):
+        encode_row = compile_row_encoder()
+        rows = products.values_list(*PRODUCT_FIELDS)
+        return dumps({"products": [encode_row(row) for row in rows]})
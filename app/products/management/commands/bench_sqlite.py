@@ -0,0 +1,98 @@
+import json
+import os
+import tempfile
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory, override_settings
+from rest_framework.authtoken.models import Token
+
+from products.bench import benchmark_database, latency_stats, run_load, seed_products, wsgi_request
+from products.models import Product
+
+PROFILES = {
+    "development": {"CONN_MAX_AGE": 0},
+    "production": {"CONN_MAX_AGE": 600},
+}
+
+
+class Command(BaseCommand):
+    help = "Compares SQLite database profiles under concurrent readers and rating writers"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=10000)
+        parser.add_argument("--users", type=int, default=100)
+        parser.add_argument("--requests", type=int, default=2000)
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument("--write-ratio", type=float, default=0.2,
+                            help="Fraction of requests rating a product")
+        parser.add_argument("--profiles", nargs="+", choices=list(PROFILES), default=list(PROFILES))
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("bench_sqlite needs a SQLite database")
+        results = {}
+        with tempfile.TemporaryDirectory() as directory:
+            for profile in options["profiles"]:
+                name = os.path.join(directory, "{}.sqlite3".format(profile))
+                with override_settings(DATABASE_PROFILE=profile), \
+                        benchmark_database(name=name):
+                    old_max_age = connection.settings_dict["CONN_MAX_AGE"]
+                    connection.settings_dict["CONN_MAX_AGE"] = PROFILES[profile]["CONN_MAX_AGE"]
+                    try:
+                        results[profile] = self._run(options)
+                    finally:
+                        connection.settings_dict["CONN_MAX_AGE"] = old_max_age
+        self.stdout.write(json.dumps(results, indent=2))
+
+    def _run(self, options):
+        cache.clear()
+        seed_products(options["products"])
+        User.objects.bulk_create(
+            User(username="bench_user_{}".format(i)) for i in range(options["users"]))
+        tokens = [token.key for token in Token.objects.bulk_create(
+            Token(user=user, key=Token.generate_key()) for user in User.objects.all())]
+        product_ids = list(Product.objects.order_by("id").values_list("id", flat=True))
+        # Connections opened by this thread would hold the database file
+        connection.close()
+
+        handler = WSGIHandler()
+        factory = RequestFactory()
+        write_every = round(1 / options["write_ratio"]) if options["write_ratio"] else 0
+        timings = {"read": [], "write": []}
+        errors = []
+        lock = threading.Lock()
+
+        def send(i):
+            if write_every and i % write_every == 0:
+                kind = "write"
+                writer = i // write_every
+                request = factory.post(
+                    "/products/{}/rate-product/".format(product_ids[writer // len(tokens)]),
+                    {"value": i % 6}, HTTP_AUTHORIZATION="Token {}".format(tokens[writer % len(tokens)]))
+            elif i % 2:
+                kind = "read"
+                request = factory.get("/products/{}/".format(product_ids[i * 7919 % len(product_ids)]))
+            else:
+                kind = "read"
+                request = factory.get("/products/", {"order_by": "rating", "page": i % 50 + 1})
+            start = time.perf_counter()
+            status = wsgi_request(handler, request)
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                timings[kind].append(elapsed)
+                if status >= 500:
+                    errors.append(status)
+
+        result = run_load(send, options["requests"], options["concurrency"])
+        return {
+            "throughput_rps": result["throughput_rps"],
+            "readers": dict({"requests": len(timings["read"])}, **latency_stats(timings["read"])),
+            "writers": dict({"requests": len(timings["write"])}, **latency_stats(timings["write"])),
+            "errors": len(errors),
+        }
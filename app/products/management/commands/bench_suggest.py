@@ -0,0 +1,65 @@
+import json
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from products.bench import benchmark_database, measure, seed_products
+from products.models import Product
+from products.pagination import order_products
+from products.search import search_products
+from products.suggest import SuggestIndex
+
+
+class Command(BaseCommand):
+    help = "Benchmarks build time, memory and query latency of the typeahead prefix index"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", nargs="+", type=int, default=[10000, 100000, 1000000])
+        parser.add_argument("--repeat", type=int, default=200)
+        parser.add_argument("--prefixes", nargs="+",
+                            default=["", "p", "product 1", "product 12", "product 1234"])
+
+    def handle(self, *args, **options):
+        results = []
+        with benchmark_database():
+            seeded = 0
+            for size in sorted(set(options["sizes"])):
+                seed_products(size - seeded, start=seeded)
+                seeded = size
+
+                index = SuggestIndex(max_size=size, refresh_interval=3600)
+                start = time.perf_counter()
+                index.suggest("", 10)
+                build_seconds = time.perf_counter() - start
+
+                tracemalloc.start()
+                index = SuggestIndex(max_size=size, refresh_interval=3600)
+                index.suggest("", 10)
+                memory = tracemalloc.get_traced_memory()[0]
+                tracemalloc.stop()
+
+                result = {
+                    "products": size,
+                    "build_seconds": round(build_seconds, 2),
+                    "memory_mb": round(memory / 2 ** 20, 1),
+                    "memory_mb_per_million": round(memory / size * 10 ** 6 / 2 ** 20, 1),
+                    "suggest": {
+                        repr(prefix): measure(lambda: index.suggest(prefix, 10), options["repeat"])
+                        for prefix in options["prefixes"]
+                    },
+                    # Substring filter of the list endpoint, ordered the same way
+                    "database_search": {
+                        repr(prefix): measure(
+                            lambda: self._database_search(prefix), max(1, options["repeat"] // 20))
+                        for prefix in options["prefixes"]
+                    },
+                }
+                results.append(result)
+                self.stderr.write("{} products done".format(size))
+        self.stdout.write(json.dumps(results, indent=2))
+
+    def _database_search(self, prefix):
+        products = search_products(Product.objects.all(), prefix)
+        return list(order_products(products, "rating", True)
+                    .values_list("id", "name", "rating")[:10])
@@ -0,0 +1,66 @@
+import json
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.test import Client, RequestFactory
+from django.test.utils import override_settings
+from rest_framework.request import Request
+
+from products import throttling
+from products.bench import benchmark_database, measure, seed_products
+from products.throttling import CacheTokenBuckets, TokenBucketThrottle, TokenBuckets
+
+
+class Command(BaseCommand):
+    help = "Measures token bucket throttle overhead per request against latency of a write request"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10000,
+                            help="Distinct users, so buckets are created and evicted")
+        parser.add_argument("--repeat", type=int, default=10000)
+        parser.add_argument("--requests", type=int, default=300,
+                            help="Write requests sent with and without throttling")
+
+    def handle(self, *args, **options):
+        rate = "{}/min".format(options["repeat"] * options["requests"])
+        throttled = override_settings(REST_FRAMEWORK=dict(
+            settings.REST_FRAMEWORK, DEFAULT_THROTTLE_RATES={"write": rate}))
+        results = {}
+        with benchmark_database():
+            seed_products(10)
+            users = [User(pk=i + 1, username="user_{}".format(i)) for i in range(options["users"])]
+            factory = RequestFactory()
+
+            with throttled:
+                for backend, buckets in [("memory", TokenBuckets()), ("cache", CacheTokenBuckets("default"))]:
+                    throttle = TokenBucketThrottle()
+                    throttle.buckets = buckets
+                    request = Request(factory.post("/products/"))
+
+                    def check():
+                        check.calls += 1
+                        request.user = users[check.calls % len(users)]
+                        throttle.allow_request(request, None)
+                    check.calls = 0
+
+                    buckets.clear()
+                    result = measure(check, options["repeat"])
+                    results["allow_request_" + backend] = {
+                        "repeat": result["repeat"],
+                        "mean_us": round(result["mean_ms"] * 1000, 2),
+                        "p99_us": round(result["p99_ms"] * 1000, 2),
+                    }
+
+            client = Client()
+
+            def create():
+                create.calls += 1
+                client.post("/products/", {"name": "new {}".format(create.calls), "price": 1})
+            create.calls = 0
+
+            results["create_unthrottled"] = measure(create, options["requests"])
+            with throttled:
+                throttling.token_buckets.clear()
+                results["create_throttled"] = measure(create, options["requests"])
+        self.stdout.write(json.dumps(results, indent=2))
@@ -0,0 +1,32 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.scores import CHUNK_SIZE, compute_scores
+
+
+class Command(BaseCommand):
+    help = "Recomputes Bayesian and time-decayed scores of products from their ratings"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE,
+                            help="Ratings held in memory at once")
+        parser.add_argument("--prior-weight", type=float,
+                            help="Global mean ratings every product starts with")
+        parser.add_argument("--half-life-days", type=float,
+                            help="Age at which a rating counts half")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        try:
+            scored = compute_scores(
+                prior_weight=options["prior_weight"],
+                half_life_days=options["half_life_days"],
+                chunk_size=options["chunk_size"])
+        except RuntimeError as e:
+            raise CommandError(e)
+        self.stdout.write(json.dumps({
+            "products": scored,
+            "seconds": round(time.perf_counter() - start, 2),
+        }, indent=2))
@@ -0,0 +1,41 @@
+import json
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+
+from products.ratings import drain_ratings
+
+
+class Command(BaseCommand):
+    help = "Applies ratings queued in write-behind mode, until stopped by SIGTERM or SIGINT"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000,
+                            help="Pending ratings applied in one transaction")
+        parser.add_argument("--interval", type=float, default=1.0,
+                            help="Seconds to wait when the queue is empty")
+        parser.add_argument("--once", action="store_true",
+                            help="Exit when the queue is empty")
+
+    def handle(self, *args, **options):
+        stopping = threading.Event()
+        if not options["once"]:
+            for signum in (signal.SIGTERM, signal.SIGINT):
+                signal.signal(signum, lambda *args: stopping.set())
+
+        drained = 0
+        while not stopping.is_set():
+            count = drain_ratings(options["batch_size"])
+            drained += count
+            if count == 0:
+                if options["once"]:
+                    break
+                stopping.wait(options["interval"])
+        # Flush whatever was queued before shutdown, so no accepted rating waits for a restart
+        while True:
+            count = drain_ratings(options["batch_size"])
+            if count == 0:
+                break
+            drained += count
+        self.stdout.write(json.dumps({"drained": drained}, indent=2))
@@ -0,0 +1,27 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.importer import BATCH_SIZE, import_products, read_csv, read_ndjson
+
+
+class Command(BaseCommand):
+    help = "Creates or updates products by name from NDJSON or CSV file"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=["csv", "ndjson"],
+                            help="File format, guessed from extension by default")
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        file_format = options["format"]
+        if file_format is None:
+            file_format = "csv" if options["path"].endswith(".csv") else "ndjson"
+        reader = read_csv if file_format == "csv" else read_ndjson
+        try:
+            with open(options["path"], newline="", encoding="utf-8") as f:
+                result = import_products(reader(f), options["batch_size"])
+        except OSError as e:
+            raise CommandError(e)
+        self.stdout.write(json.dumps(result, indent=2))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from products.cache import product_cache
+from products.ratings import reconcile_ratings
+
+
+class Command(BaseCommand):
+    help = "Reconciles product rating aggregates against product ratings"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true",
+                            help="Only report products that are out of sync")
+
+    def handle(self, *args, **options):
+        mismatched = reconcile_ratings(fix=not options["dry_run"])
+        if not options["dry_run"]:
+            for product_id in mismatched:
+                product_cache.invalidate_product(product_id)
+        if options["dry_run"]:
+            message = "{} products out of sync"
+        else:
+            message = "{} products reconciled"
+        self.stdout.write(message.format(len(mismatched)))
+        for product_id in mismatched:
+            self.stdout.write("  product {}".format(product_id))
@@ -0,0 +1,37 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+
+from products.seeding import BATCH_SIZE, seed_catalog
+
+
+class Command(BaseCommand):
+    help = "Generates a synthetic catalog of products, users and Zipf distributed ratings"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=10000)
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--ratings", type=int, default=100000)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--skew", type=float, default=1.1,
+                            help="Zipf exponent of product popularity")
+        parser.add_argument("--prefix", default="seed",
+                            help="Prefix of generated product names and usernames")
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        try:
+            result = seed_catalog(
+                options["products"], options["users"], options["ratings"],
+                seed=options["seed"], skew=options["skew"],
+                prefix=options["prefix"], batch_size=options["batch_size"])
+        except ValueError as e:
+            raise CommandError(e)
+        except IntegrityError:
+            raise CommandError("Catalog with prefix {!r} already exists, use another --prefix"
+                               .format(options["prefix"]))
+        result["seconds"] = round(time.perf_counter() - start, 2)
+        self.stdout.write(json.dumps(result, indent=2))
@@ -0,0 +1,214 @@
+import asyncio
+import logging
+import re
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.utils.decorators import sync_and_async_middleware
+
+logger = logging.getLogger(__name__)
+
+QUANTILES = (0.5, 0.95, 0.99)
+SAMPLE_SIZE = 1024
+
+_current_request = ContextVar("products_request_metrics", default=None)
+_in_clause = re.compile(r"IN \((%s,? ?)+\)")
+
+
+class RequestMetrics:
+    """
+    Measurements of a single request.
+    """
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.serializer_seconds = 0.0
+        self.similar_queries = Counter()
+
+
+class Summary:
+    """
+    Count and sum of all observations, with quantiles over the most recent ones.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.samples = deque(maxlen=SAMPLE_SIZE)
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        self.samples.append(value)
+
+    def quantiles(self):
+        samples = sorted(self.samples)
+        if not samples:
+            return {q: 0 for q in QUANTILES}
+        return {q: samples[min(len(samples) - 1, int(q * len(samples)))] for q in QUANTILES}
+
+
+class MetricsRegistry:
+    """
+    Per-endpoint request metrics of this process.
+    """
+    SUMMARIES = [
+        ("request_duration_seconds", "Wall time of requests"),
+        ("db_queries", "Database queries per request"),
+        ("db_duration_seconds", "Database time per request"),
+        ("serializer_duration_seconds", "Serialization time per request"),
+        ("response_size_bytes", "Size of non-streaming responses"),
+    ]
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._summaries = {}
+        self._requests = Counter()
+
+    def observe(self, endpoint, method, status_code, duration, metrics, response_size):
+        labels = (endpoint, method)
+        values = {
+            "request_duration_seconds": duration,
+            "db_queries": metrics.db_queries,
+            "db_duration_seconds": metrics.db_seconds,
+            "serializer_duration_seconds": metrics.serializer_seconds,
+            "response_size_bytes": response_size,
+        }
+        with self._lock:
+            self._requests[labels + (str(status_code),)] += 1
+            for name, value in values.items():
+                if value is None:
+                    continue
+                summary = self._summaries.setdefault((name, labels), Summary())
+                summary.observe(value)
+
+    def reset(self):
+        with self._lock:
+            self._summaries.clear()
+            self._requests.clear()
+
+    def summary(self, name, endpoint, method):
+        with self._lock:
+            return self._summaries.get((name, (endpoint, method)))
+
+    def render(self, prefix="products"):
+        """
+        Returns metrics in Prometheus text exposition format.
+        """
+        lines = []
+        with self._lock:
+            lines.append("# HELP {}_requests_total Requests by endpoint, method and status".format(prefix))
+            lines.append("# TYPE {}_requests_total counter".format(prefix))
+            for (endpoint, method, status), count in sorted(self._requests.items()):
+                lines.append('{}_requests_total{{endpoint="{}",method="{}",status="{}"}} {}'.format(
+                    prefix, _escape(endpoint), method, status, count))
+            for name, description in self.SUMMARIES:
+                metric = "{}_{}".format(prefix, name)
+                lines.append("# HELP {} {}".format(metric, description))
+                lines.append("# TYPE {} summary".format(metric))
+                for (summary_name, (endpoint, method)), summary in sorted(self._summaries.items()):
+                    if summary_name != name:
+                        continue
+                    labels = 'endpoint="{}",method="{}"'.format(_escape(endpoint), method)
+                    for quantile, value in summary.quantiles().items():
+                        lines.append('{}{{{},quantile="{}"}} {}'.format(metric, labels, quantile, value))
+                    lines.append("{}_sum{{{}}} {}".format(metric, labels, summary.sum))
+                    lines.append("{}_count{{{}}} {}".format(metric, labels, summary.count))
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+registry = MetricsRegistry()
+
+
+@contextmanager
+def timed_serialization():
+    """
+    Adds time spent in the block to serializer time of the current request.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics = _current_request.get()
+        if metrics is not None:
+            metrics.serializer_seconds += time.perf_counter() - start
+
+
+def query_recorder(execute, sql, params, many, context):
+    """
+    Database execute wrapper, installed on every connection,
+    that accounts queries to the current request.
+    """
+    metrics = _current_request.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.db_queries += 1
+        metrics.db_seconds += time.perf_counter() - start
+        metrics.similar_queries[_in_clause.sub("IN (...)", sql)] += 1
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    if query_recorder not in connection.execute_wrappers:
+        connection.execute_wrappers.append(query_recorder)
+
+
+def _endpoint(request):
+    match = getattr(request, "resolver_match", None)
+    return match.view_name if match is not None else "unmatched"
+
+
+def _finish(request, response, start, metrics):
+    duration = time.perf_counter() - start
+    endpoint = _endpoint(request)
+    size = None if response.streaming else len(response.content)
+    registry.observe(endpoint, request.method, response.status_code, duration, metrics, size)
+    if getattr(settings, "METRICS_DETECT_N_PLUS_ONE", False):
+        threshold = getattr(settings, "METRICS_N_PLUS_ONE_THRESHOLD", 5)
+        for sql, count in metrics.similar_queries.items():
+            if count >= threshold:
+                logger.warning("Possible N+1 queries in %s %s: %d similar queries: %s",
+                               request.method, endpoint, count, sql)
+
+
+@sync_and_async_middleware
+def metrics_middleware(get_response):
+    """
+    Records wall time, database queries and time, serializer time
+    and response size of every request.
+    """
+    if asyncio.iscoroutinefunction(get_response):
+        async def middleware(request):
+            metrics = RequestMetrics()
+            token = _current_request.set(metrics)
+            start = time.perf_counter()
+            try:
+                response = await get_response(request)
+            finally:
+                _current_request.reset(token)
+            _finish(request, response, start, metrics)
+            return response
+    else:
+        def middleware(request):
+            metrics = RequestMetrics()
+            token = _current_request.set(metrics)
+            start = time.perf_counter()
+            try:
+                response = get_response(request)
+            finally:
+                _current_request.reset(token)
+            _finish(request, response, start, metrics)
+            return response
+    return middleware
@@ -0,0 +1,35 @@
+# Generated by Django 4.1 on 2026-10-18 11:23
+
+from django.db import migrations, models
+
+from products.search import build_search_value
+
+
+def backfill_search_value(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    batch = []
+    for product in Product.objects.only('name', 'price', 'rating').iterator(chunk_size=2000):
+        product.search_value = build_search_value(
+            product.name, product.price, product.rating)
+        batch.append(product)
+        if len(batch) >= 2000:
+            Product.objects.bulk_update(batch, ['search_value'])
+            batch = []
+    if batch:
+        Product.objects.bulk_update(batch, ['search_value'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_alter_product_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_value',
+            field=models.TextField(default='', editable=False),
+        ),
+        migrations.RunPython(backfill_search_value, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.1 on 2026-10-18 11:24
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_rating_aggregates(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    ProductRating = apps.get_model('products', 'ProductRating')
+    rows = (ProductRating.objects
+            .values('product_id')
+            .annotate(count=Count('id'), sum=Sum('value'))
+            .values_list('product_id', 'count', 'sum'))
+    batch = []
+    for product_id, count, total in rows.iterator(chunk_size=2000):
+        batch.append(Product(id=product_id, rating_count=count, rating_sum=total))
+        if len(batch) >= 2000:
+            Product.objects.bulk_update(batch, ['rating_count', 'rating_sum'])
+            batch = []
+    if batch:
+        Product.objects.bulk_update(batch, ['rating_count', 'rating_sum'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_product_search_value'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_sum',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_rating_aggregates, migrations.RunPython.noop),
+    ]
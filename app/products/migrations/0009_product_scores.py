@@ -0,0 +1,38 @@
+# Generated by Django 4.1 on 2026-10-18 12:05
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0008_product_ordering_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='bayesian_rating',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='decayed_rating',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='productrating',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['bayesian_rating', 'id'], name='product_bayesian_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['decayed_rating', 'id'], name='product_decayed_id_idx'),
+        ),
+    ]
@@ -6,11 +6,28 @@ class Product(models.Model):
     name = models.CharField(max_length=200, null=False, unique=True)
     price = models.DecimalField(null=False, decimal_places=2, max_digits=12)
     rating = models.FloatField(null=False, default=0)
+    rating_count = models.PositiveIntegerField(null=False, default=0)
+    rating_sum = models.PositiveBigIntegerField(null=False, default=0)
+    bayesian_rating = models.FloatField(null=False, default=0)
+    decayed_rating = models.FloatField(null=False, default=0)
     updated_at = models.DateTimeField(null=False, auto_now_add=True)
+    search_value = models.TextField(null=False, default="", editable=False)
+    # Change number of the last write, see products.changes
+    change_seq = models.BigIntegerField(null=False, default=0, editable=False)
 
     def __str__(self):
         return self.name
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["price", "id"], name="product_price_id_idx"),
+            models.Index(fields=["rating", "id"], name="product_rating_id_idx"),
+            models.Index(fields=["updated_at", "id"], name="product_updated_at_id_idx"),
+            models.Index(fields=["bayesian_rating", "id"], name="product_bayesian_id_idx"),
+            models.Index(fields=["decayed_rating", "id"], name="product_decayed_id_idx"),
+            models.Index(fields=["change_seq", "id"], name="product_change_id_idx"),
+        ]
+
     def _search_value(self):
         return "{} {} {}".format(self.name, self.price, round(self.rating, 3))
 
@@ -19,9 +36,43 @@ class ProductRating(models.Model):
     user_id = models.ForeignKey(to=User, on_delete=models.SET_NULL, null=True)
     product_id = models.ForeignKey(to=Product, on_delete=models.CASCADE)
     value = models.PositiveSmallIntegerField(null=False)
+    created_at = models.DateTimeField(null=False, auto_now_add=True)
 
     def __str__(self):
         return "{} rated {} with {} stars".format(self.user_id, self.product_id, self.value)
 
     class Meta:
         unique_together = ('user_id', 'product_id',)
+
+
+class PendingRating(models.Model):
+    """
+    Rating accepted in write-behind mode, waiting for drain_ratings to apply it.
+    """
+    user_id = models.ForeignKey(to=User, on_delete=models.CASCADE)
+    product_id = models.ForeignKey(to=Product, on_delete=models.CASCADE)
+    value = models.PositiveSmallIntegerField(null=False)
+    created_at = models.DateTimeField(null=False, auto_now_add=True)
+
+    class Meta:
+        unique_together = ('user_id', 'product_id',)
+
+
+class ProductTombstone(models.Model):
+    """
+    Deleted product, kept for the change feed.
+    """
+    product_id = models.BigIntegerField(null=False)
+    change_seq = models.BigIntegerField(null=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["change_seq", "product_id"], name="tombstone_change_product_idx"),
+        ]
+
+
+class ChangeCounter(models.Model):
+    """
+    Single row holding the last change number given to a product write.
+    """
+    value = models.BigIntegerField(null=False, default=0)
@@ -0,0 +1,108 @@
+from django.core import signing
+from django.db.models import Q
+
+from .encoders import PRODUCT_FIELDS
+from .models import Product
+
+# Fields with an index usable for ordering, see Product.Meta.indexes
+ORDERABLE_FIELDS = ["name", "price", "rating", "bayesian_rating", "decayed_rating", "updated_at"]
+CURSOR_SALT = "products.cursor"
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def wants_meta(params):
+    """
+    Returns True if list query asks for pagination metadata.
+    """
+    return params.get("meta") in ("1", "true")
+
+
+def order_products(queryset, order_by, descending):
+    """
+    Orders products by order_by with id as a tie-breaker,
+    so the ordering is stable and matches a (field, id) index.
+    """
+    prefix = "-" if descending else ""
+    return queryset.order_by(prefix + order_by, prefix + "id")
+
+
+def encode_cursor(order_by, descending, value, last_id):
+    """
+    Returns opaque signed cursor pointing after product with
+    given order_by value and id.
+    """
+    if not isinstance(value, (str, float, int)):
+        value = str(value)
+    return signing.dumps([order_by, descending, value, last_id],
+                         salt=CURSOR_SALT, compress=True)
+
+
+def decode_cursor(cursor):
+    """
+    Returns (order_by, descending, value, id) stored in the cursor.
+    """
+    try:
+        order_by, descending, value, last_id = signing.loads(
+            cursor, salt=CURSOR_SALT)
+    except (signing.BadSignature, ValueError, TypeError):
+        raise InvalidCursor("invalid cursor")
+    if order_by not in ORDERABLE_FIELDS:
+        raise InvalidCursor("invalid cursor")
+    value = Product._meta.get_field(order_by).to_python(value)
+    return order_by, descending, value, last_id
+
+
+def cursor_page(queryset, order_by, descending, cursor, per_page, fields=PRODUCT_FIELDS):
+    """
+    Returns (value tuples of fields, next_cursor) for a page after the cursor.
+    Rows are found by seeking on (order_by, id), so no COUNT or OFFSET is used.
+    Empty cursor returns the first page.
+    """
+    rows = list(cursor_queryset(
+        queryset, order_by, descending, cursor, per_page, fields))
+    return cursor_result(rows, order_by, descending, per_page, fields)
+
+
+async def acursor_page(queryset, order_by, descending, cursor, per_page, fields=PRODUCT_FIELDS):
+    """
+    Async version of cursor_page.
+    """
+    rows = [row async for row in cursor_queryset(
+        queryset, order_by, descending, cursor, per_page, fields)]
+    return cursor_result(rows, order_by, descending, per_page, fields)
+
+
+def cursor_queryset(queryset, order_by, descending, cursor, per_page, fields):
+    """
+    Returns query for value tuples of a page after the cursor,
+    with one extra row to detect the next page.
+    """
+    if order_by not in ORDERABLE_FIELDS:
+        raise InvalidCursor("can not order by {}".format(order_by))
+
+    if cursor:
+        cursor_order_by, cursor_descending, value, last_id = decode_cursor(
+            cursor)
+        if (cursor_order_by, cursor_descending) != (order_by, descending):
+            raise InvalidCursor("cursor does not match the ordering")
+        lookup = "lt" if descending else "gt"
+        queryset = queryset.filter(
+            Q(**{"{}__{}".format(order_by, lookup): value}) |
+            Q(**{order_by: value, "id__{}".format(lookup): last_id})
+        )
+
+    queryset = order_products(queryset, order_by, descending)
+    return queryset.values_list(*fields)[:per_page + 1]
+
+
+def cursor_result(rows, order_by, descending, per_page, fields):
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        next_cursor = encode_cursor(
+            order_by, descending,
+            rows[-1][fields.index(order_by)], rows[-1][fields.index("id")])
+    return rows, next_cursor
@@ -0,0 +1,171 @@
+import threading
+from bisect import bisect_left
+
+from django.conf import settings
+
+from .cache import product_cache
+from .encoders import PRODUCT_FIELDS
+from .models import Product
+from .pagination import order_products
+
+# Orderings with a maintained ranking, each in both directions
+RANKED_FIELDS = ["rating", "price"]
+
+
+class Ranking:
+    """
+    First products of one ordering, as value tuples of PRODUCT_FIELDS.
+    Rows are always an exact prefix of the ordering.
+    Complete ranking holds every product.
+    """
+
+    def __init__(self, order_by, descending, rows, complete):
+        self.order_by = order_by
+        self.descending = descending
+        self._index = PRODUCT_FIELDS.index(order_by)
+        self.rows = list(rows)
+        self.keys = [self.key(row) for row in self.rows]
+        self.complete = complete
+
+    def key(self, row):
+        if self.descending:
+            return (-row[self._index], -row[0])
+        return (row[self._index], row[0])
+
+    def page(self, offset, limit):
+        """
+        Returns rows at offset..offset + limit, or None if they are not all known.
+        """
+        if offset + limit > len(self.rows) and not self.complete:
+            return None
+        return self.rows[offset:offset + limit]
+
+    def remove(self, pk):
+        for i, row in enumerate(self.rows):
+            if row[0] == pk:
+                del self.rows[i]
+                del self.keys[i]
+                return
+
+    def add(self, row, size):
+        """
+        Adds a product, if it belongs to the prefix, and keeps at most size rows.
+        """
+        key = self.key(row)
+        if not self.complete and (not self.keys or key > self.keys[-1]):
+            return
+        i = bisect_left(self.keys, key)
+        self.keys.insert(i, key)
+        self.rows.insert(i, row)
+        if len(self.rows) > size:
+            del self.rows[size:]
+            del self.keys[size:]
+            self.complete = False
+
+
+class ProductRankings:
+    """
+    Keeps first products of rating and price orderings in memory of this process,
+    so first pages of those listings are served without a query.
+    Writes made by this process are applied incrementally.
+    Any other change of the catalog version in product_cache rebuilds the rankings,
+    including the one made when product_cache polls writes of other processes,
+    so those are served within PRODUCTS_CACHE_POLL_SECONDS.
+    """
+
+    def __init__(self, size=None):
+        self.size = size or getattr(settings, "PRODUCTS_RANKING_SIZE", 200)
+        self._lock = threading.Lock()
+        self._rankings = {}
+        self._version = None
+
+    def page(self, order_by, descending, offset, limit):
+        """
+        Returns value tuples of products at offset..offset + limit of an ordering,
+        or None if the ordering is not ranked or the rows are not all known.
+        """
+        if order_by not in RANKED_FIELDS:
+            return None
+        version = product_cache.catalog_version()
+        with self._lock:
+            ranking = self._rankings.get((order_by, descending))
+            if version != self._version or \
+                    (len(ranking.rows) < self.size // 2 and not ranking.complete):
+                self._rebuild(version)
+                ranking = self._rankings[(order_by, descending)]
+            return ranking.page(offset, limit)
+
+    def product_changed(self, pk, version):
+        """
+        Applies a created or updated product, after product_cache
+        was invalidated to given catalog version.
+        """
+        if self._version is None:
+            return
+        row = Product.objects.filter(pk=pk).values_list(*PRODUCT_FIELDS).first()
+        with self._lock:
+            if self._can_apply(version):
+                for ranking in self._rankings.values():
+                    ranking.remove(pk)
+                    if row is not None:
+                        ranking.add(row, self.size)
+
+    def product_deleted(self, pk, version):
+        """
+        Applies a deleted product, after product_cache
+        was invalidated to given catalog version.
+        """
+        with self._lock:
+            if self._can_apply(version):
+                for ranking in self._rankings.values():
+                    ranking.remove(pk)
+
+    def check(self):
+        """
+        Compares every ranking with a full query of its ordering.
+        Rankings behind the catalog version are rebuilt on next use, so they are not compared.
+        Returns (order_by, descending) of rankings that differ.
+        """
+        version = product_cache.catalog_version()
+        with self._lock:
+            if version != self._version:
+                return []
+            rankings = list(self._rankings.values())
+        mismatched = []
+        for ranking in rankings:
+            expected = list(order_products(
+                Product.objects.all(), ranking.order_by, ranking.descending,
+            ).values_list(*PRODUCT_FIELDS)[:len(ranking.rows) + 1])
+            if expected[:len(ranking.rows)] != ranking.rows or \
+                    ranking.complete and len(expected) > len(ranking.rows):
+                mismatched.append((ranking.order_by, ranking.descending))
+        return mismatched
+
+    def clear(self):
+        with self._lock:
+            self._rankings = {}
+            self._version = None
+
+    def _can_apply(self, version):
+        # Only a version right after ours means no one else changed the catalog
+        if self._version is not None and version == self._version + 1:
+            self._version = version
+            return True
+        self._version = None
+        return False
+
+    def _rebuild(self, version):
+        rankings = {}
+        for order_by in RANKED_FIELDS:
+            for descending in [False, True]:
+                rows = order_products(
+                    Product.objects.all(), order_by, descending,
+                ).values_list(*PRODUCT_FIELDS)[:self.size + 1]
+                rows = list(rows)
+                rankings[(order_by, descending)] = Ranking(
+                    order_by, descending, rows[:self.size], len(rows) <= self.size)
+        self._rankings = rankings
+        self._version = version
+
+
+product_rankings = ProductRankings()
@@ -0,0 +1,193 @@
+import logging
+
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from .cache import product_cache
+from .changes import next_change
+from .models import PendingRating, Product, ProductRating
+from .search import build_search_value
+
+logger = logging.getLogger(__name__)
+
+
+def add_rating(product_id, value):
+    """
+    Adds a rating value to running aggregates of a product.
+    The product is read locked and written once with its search value,
+    so concurrent ratings can not overwrite each other.
+    It must run in a transaction, after the rating was inserted,
+    which on SQLite holds the write lock, see next_change.
+    """
+    product = Product.objects.select_for_update().get(pk=product_id)
+    product.rating_count += 1
+    product.rating_sum += value
+    product.rating = product.rating_sum / product.rating_count
+    product.updated_at = timezone.now()
+    product.save(update_fields=[
+        "rating_count", "rating_sum", "rating", "updated_at", "change_seq", "search_value"])
+    return product
+
+
+def add_ratings(ratings):
+    """
+    Inserts many ratings given as (index, user_id, product_id, value).
+    Existing (user, product) pairs are found with one query,
+    and every touched product is recomputed once from one grouped query.
+    The write lock is taken before the pairs are read, so no other writer
+    can add a pair between the check and the insert.
+    Returns (created ratings, {index: error}, change number of the write).
+    """
+    errors = {}
+    product_ids = {product_id for _, _, product_id, _ in ratings}
+    user_ids = {user_id for _, user_id, _, _ in ratings}
+    with transaction.atomic():
+        change_seq = next_change()
+        products = Product.objects.only("name", "price").in_bulk(product_ids)
+        existing_users = set(User.objects.filter(
+            id__in=user_ids).values_list("id", flat=True))
+        rated = set(ProductRating.objects
+                    .filter(product_id__in=product_ids, user_id__in=user_ids)
+                    .values_list("user_id", "product_id"))
+
+        new_ratings = []
+        for index, user_id, product_id, value in ratings:
+            if product_id not in products:
+                errors[index] = {"product_id": ["product does not exist"]}
+            elif user_id not in existing_users:
+                errors[index] = {"user_id": ["user does not exist"]}
+            elif (user_id, product_id) in rated:
+                errors[index] = {"non_field_errors": [
+                    "user already rated this product"]}
+            else:
+                rated.add((user_id, product_id))
+                new_ratings.append(ProductRating(
+                    user_id_id=user_id, product_id_id=product_id, value=value))
+
+        ProductRating.objects.bulk_create(new_ratings)
+        touched = {rating.product_id_id for rating in new_ratings}
+        update_rating_aggregates([products[pk] for pk in touched], change_seq)
+    return new_ratings, errors, change_seq
+
+
+def enqueue_rating(user_id, product_id, value):
+    """
+    Stores a validated rating for drain_ratings to apply later.
+    Returns False if the user already has a pending rating of the product.
+    """
+    try:
+        with transaction.atomic():
+            PendingRating.objects.create(
+                user_id_id=user_id, product_id_id=product_id, value=value)
+    except IntegrityError:
+        return False
+    return True
+
+
+def drain_ratings(batch_size=1000):
+    """
+    Applies the oldest batch_size pending ratings with add_ratings,
+    so every product rated in the batch gets one aggregate update.
+    Ratings that can no longer be applied are dropped and logged.
+    Returns number of pending ratings that were taken from the queue.
+    """
+    with transaction.atomic():
+        pending = list(PendingRating.objects.order_by("id").values_list(
+            "id", "user_id", "product_id", "value")[:batch_size])
+        if not pending:
+            return 0
+        created, errors, change_seq = add_ratings(pending)
+        PendingRating.objects.filter(id__in=[row[0] for row in pending]).delete()
+    for pending_id, error in errors.items():
+        logger.warning("Dropped pending rating %s: %s", pending_id, error)
+    product_cache.invalidate_products({rating.product_id_id for rating in created}, change_seq)
+    return len(pending)
+
+
+def rating_queue_depth():
+    return PendingRating.objects.count()
+
+
+def update_rating_aggregates(products, change_seq):
+    """
+    Recomputes rating aggregates of given products from their ratings,
+    writing them with change_seq of the current transaction, see next_change.
+    """
+    aggregates = rating_aggregates([product.id for product in products])
+    now = timezone.now()
+    for product in products:
+        count, total = aggregates.get(product.id, (0, 0))
+        product.rating_count = count
+        product.rating_sum = total
+        product.rating = total / count if count else 0
+        product.updated_at = now
+        product.change_seq = change_seq
+        product.search_value = build_search_value(
+            product.name, product.price, product.rating)
+    Product.objects.bulk_update(products, [
+        "rating_count", "rating_sum", "rating", "updated_at", "change_seq", "search_value"])
+
+
+def rating_aggregates(product_ids):
+    """
+    Returns {product_id: (count, sum)} of ratings for given products,
+    computed by one grouped query.
+    """
+    rows = (ProductRating.objects
+            .filter(product_id__in=product_ids)
+            .values("product_id")
+            .annotate(count=Count("id"), sum=Sum("value"))
+            .values_list("product_id", "count", "sum"))
+    return {product_id: (count, total) for product_id, count, total in rows}
+
+
+def reconcile_ratings(products=None, fix=True, chunk_size=2000):
+    """
+    Compares rating aggregates of products with their ProductRating rows.
+    Mismatched products are fixed, unless fix is False.
+    Returns ids of products that were out of sync.
+    """
+    if products is None:
+        products = Product.objects.all()
+    products = products.only(
+        "name", "price", "rating", "rating_count", "rating_sum").order_by("id")
+
+    mismatched = []
+    chunk = []
+    for product in products.iterator(chunk_size=chunk_size):
+        chunk.append(product)
+        if len(chunk) >= chunk_size:
+            mismatched += _reconcile_chunk(chunk, fix)
+            chunk = []
+    if chunk:
+        mismatched += _reconcile_chunk(chunk, fix)
+    return mismatched
+
+
+def _reconcile_chunk(products, fix):
+    aggregates = rating_aggregates([product.id for product in products])
+    now = timezone.now()
+    changed = []
+    for product in products:
+        count, total = aggregates.get(product.id, (0, 0))
+        rating = total / count if count else 0
+        if (product.rating_count, product.rating_sum) == (count, total) \
+                and product.rating == rating:
+            continue
+        product.rating_count = count
+        product.rating_sum = total
+        product.rating = rating
+        product.updated_at = now
+        product.search_value = build_search_value(
+            product.name, product.price, rating)
+        changed.append(product)
+    if fix and changed:
+        with transaction.atomic():
+            change_seq = next_change()
+            for product in changed:
+                product.change_seq = change_seq
+            Product.objects.bulk_update(changed, [
+                "rating_count", "rating_sum", "rating", "updated_at", "change_seq", "search_value"])
+    return [product.id for product in changed]
@@ -0,0 +1,119 @@
+import math
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Avg, Q
+from django.utils import timezone
+
+from .cache import product_cache
+from .changes import next_change
+from .models import Product, ProductRating
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+CHUNK_SIZE = 100000
+BATCH_SIZE = 1000
+
+
+def compute_scores(prior_weight=None, half_life_days=None, chunk_size=CHUNK_SIZE, now=None):
+    """
+    Recomputes Bayesian and time-decayed scores of every product.
+    Bayesian score is the mean of product ratings and prior_weight ratings
+    of the global mean. Decayed score is the same, but every rating is weighted
+    by exp(-age * ln 2 / half life), so old ratings fade towards the global mean.
+    Ratings are read in chunks of chunk_size ordered by product,
+    and reduced per product with NumPy, so memory does not grow with the ratings.
+    Returns number of products with ratings.
+    """
+    if np is None:
+        raise RuntimeError("numpy is required to compute scores")
+    if prior_weight is None:
+        prior_weight = getattr(settings, "PRODUCTS_SCORE_PRIOR_WEIGHT", 10)
+    if half_life_days is None:
+        half_life_days = getattr(settings, "PRODUCTS_SCORE_HALF_LIFE_DAYS", 90)
+    now = now or timezone.now()
+    decay = math.log(2) / (half_life_days * 86400)
+    mean = ProductRating.objects.aggregate(mean=Avg("value"))["mean"] or 0
+
+    def score(weights, weighted_values):
+        return (prior_weight * mean + weighted_values) / (prior_weight + weights)
+
+    scored = 0
+    carry = None
+    for product_ids, values, ages in iter_rating_chunks(chunk_size, now):
+        weights = np.exp(-decay * ages)
+        starts = np.flatnonzero(np.r_[True, product_ids[1:] != product_ids[:-1]])
+        # Columns: count, sum, decayed weight, decayed sum
+        totals = np.column_stack([
+            np.diff(np.r_[starts, len(product_ids)]).astype(np.float64),
+            np.add.reduceat(values, starts),
+            np.add.reduceat(weights, starts),
+            np.add.reduceat(weights * values, starts),
+        ])
+        ids = product_ids[starts]
+        if carry is not None and carry[0] == ids[0]:
+            totals[0] += carry[1]
+        elif carry is not None:
+            scored += _save_scores(np.array([carry[0]]), carry[1][None, :], score, now)
+        # Ratings of the last product may continue in the next chunk
+        carry = (ids[-1], totals[-1])
+        scored += _save_scores(ids[:-1], totals[:-1], score, now)
+    if carry is not None:
+        scored += _save_scores(np.array([carry[0]]), carry[1][None, :], score, now)
+
+    unrated = (Product.objects.filter(rating_count=0)
+               .exclude(bayesian_rating=mean, decayed_rating=mean))
+    with transaction.atomic():
+        updated = unrated.update(bayesian_rating=mean, decayed_rating=mean, updated_at=now,
+                                 change_seq=next_change())
+    if updated:
+        product_cache.invalidate_catalog()
+    return scored
+
+
+def iter_rating_chunks(chunk_size, now):
+    """
+    Yields (product ids, values, ages in seconds) arrays of ratings ordered by product,
+    reading at most chunk_size ratings at once with keyset pagination.
+    """
+    ratings = ProductRating.objects.order_by("product_id", "id")
+    last = None
+    while True:
+        chunk = ratings
+        if last is not None:
+            chunk = chunk.filter(
+                Q(product_id__gt=last[0]) | Q(product_id=last[0], id__gt=last[1]))
+        rows = list(chunk.values_list("product_id", "id", "value", "created_at")[:chunk_size])
+        if not rows:
+            return
+        last = rows[-1][:2]
+        product_ids, _, values, created = zip(*rows)
+        yield (
+            np.array(product_ids, dtype=np.int64),
+            np.array(values, dtype=np.float64),
+            np.array([(now - created_at).total_seconds() for created_at in created]),
+        )
+        if len(rows) < chunk_size:
+            return
+
+
+def _save_scores(ids, totals, score, now):
+    for start in range(0, len(ids), BATCH_SIZE):
+        batch_ids = ids[start:start + BATCH_SIZE]
+        batch = totals[start:start + BATCH_SIZE]
+        bayesian = score(batch[:, 0], batch[:, 1])
+        decayed = score(batch[:, 2], batch[:, 3])
+        with transaction.atomic():
+            change_seq = next_change()
+            products = [
+                Product(id=int(pk), bayesian_rating=float(b), decayed_rating=float(d),
+                        updated_at=now, change_seq=change_seq)
+                for pk, b, d in zip(batch_ids, bayesian, decayed)
+            ]
+            Product.objects.bulk_update(
+                products, ["bayesian_rating", "decayed_rating", "updated_at", "change_seq"])
+        product_cache.invalidate_products([product.id for product in products])
+    return len(ids)
@@ -0,0 +1,21 @@
+from decimal import Decimal
+
+PRICE_QUANTUM = Decimal("0.01")
+
+
+def build_search_value(name, price, rating):
+    """
+    Builds the value stored in Product.search_value.
+    Mirrors Product._search_value of a product loaded from the database,
+    lowercased so the match can be done in the database.
+    """
+    price = Decimal(str(price)).quantize(PRICE_QUANTUM)
+    return "{} {} {}".format(name, price, round(float(rating), 3)).lower()
+
+
+def search_products(queryset, search_word):
+    """
+    Filters products whose search value contains the search word.
+    The match is done by the database, so only matching rows are loaded.
+    """
+    return queryset.filter(search_value__contains=search_word.lower())
@@ -0,0 +1,112 @@
+import random
+from decimal import Decimal
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from .cache import product_cache
+from .changes import next_change
+from .models import Product, ProductRating
+from .search import build_search_value
+
+BATCH_SIZE = 10000
+
+
+def seed_catalog(products, users, ratings, seed=0, skew=1.1, prefix="seed",
+                 batch_size=BATCH_SIZE):
+    """
+    Inserts synthetic products, users and ratings with bulk_create.
+    Ratings per product follow a Zipf distribution with exponent skew,
+    and the same seed always generates the same catalog.
+    Rating aggregates are computed while generating, so products are
+    inserted with final values instead of being saved once per rating.
+    Returns numbers of created rows.
+    """
+    rng = random.Random(seed)
+    counts = zipf_counts(rng, products, users, ratings, skew)
+    values = []
+    for count in counts:
+        quality = rng.uniform(0.5, 5)
+        values.append([min(5, max(0, round(rng.gauss(quality, 1))))
+                       for _ in range(count)])
+
+    with transaction.atomic():
+        user_ids = _create_users(users, prefix, batch_size)
+        product_ids = _create_products(rng, values, prefix, batch_size)
+        batch = []
+        created = 0
+        for product_id, product_values in zip(product_ids, values):
+            raters = rng.sample(user_ids, len(product_values))
+            for user_id, value in zip(raters, product_values):
+                batch.append(ProductRating(
+                    user_id_id=user_id, product_id_id=product_id, value=value))
+            if len(batch) >= batch_size:
+                ProductRating.objects.bulk_create(batch, batch_size=batch_size)
+                created += len(batch)
+                batch = []
+        ProductRating.objects.bulk_create(batch, batch_size=batch_size)
+        created += len(batch)
+    product_cache.invalidate_catalog()
+    return {"products": len(product_ids), "users": len(user_ids), "ratings": created}
+
+
+def zipf_counts(rng, products, users, ratings, skew):
+    """
+    Distributes ratings over products with Zipf distributed popularity.
+    A product can not get more ratings than there are users,
+    so ratings over that limit are drawn again from the other products.
+    """
+    if ratings > products * users:
+        raise ValueError("ratings can not exceed products * users")
+    ranks = list(range(1, products + 1))
+    rng.shuffle(ranks)
+    weights = [1 / rank ** skew for rank in ranks]
+    counts = [0] * products
+    candidates = list(range(products))
+    remaining = ratings
+    while remaining:
+        cum_weights = list(accumulate(weights[i] for i in candidates))
+        for i in rng.choices(candidates, cum_weights=cum_weights, k=remaining):
+            counts[i] += 1
+        remaining = 0
+        open_candidates = []
+        for i in candidates:
+            if counts[i] > users:
+                remaining += counts[i] - users
+                counts[i] = users
+            elif counts[i] < users:
+                open_candidates.append(i)
+        candidates = open_candidates
+    return counts
+
+
+def _create_users(count, prefix, batch_size):
+    password = make_password(None)
+    usernames = ["{}_user_{}".format(prefix, i) for i in range(count)]
+    User.objects.bulk_create(
+        (User(username=username, password=password) for username in usernames),
+        batch_size=batch_size)
+    ids = dict(User.objects.filter(username__startswith="{}_user_".format(prefix))
+               .values_list("username", "id"))
+    return [ids[username] for username in usernames]
+
+
+def _create_products(rng, values, prefix, batch_size):
+    change_seq = next_change()
+    products = []
+    for i, product_values in enumerate(values):
+        name = "{} product {}".format(prefix, i)
+        price = Decimal(rng.randint(100, 1000000)) / 100
+        count, total = len(product_values), sum(product_values)
+        rating = total / count if count else 0
+        products.append(Product(
+            name=name, price=price, rating=rating,
+            rating_count=count, rating_sum=total, change_seq=change_seq,
+            search_value=build_search_value(name, price, rating)))
+    Product.objects.bulk_create(products, batch_size=batch_size)
+    names = [product.name for product in products]
+    ids = dict(Product.objects.filter(name__startswith="{} product ".format(prefix))
+               .values_list("name", "id"))
+    return [ids[name] for name in names]
@@ -9,7 +9,7 @@ from .models import Product, ProductRating
 class ProductSerializer(serializers.ModelSerializer):
     class Meta:
         model = Product
-        fields = ["id", "name", "price", "rating", "updated_at"]
+        fields = ["id", "name", "price", "rating", "bayesian_rating", "decayed_rating", "updated_at"]
 
 
 class ProductRequestSerializer(serializers.ModelSerializer):
@@ -18,6 +18,13 @@ class ProductRequestSerializer(serializers.ModelSerializer):
         fields = ["name", "price"]
 
 
+class ProductImportSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Product
+        fields = ["name", "price"]
+        extra_kwargs = {"name": {"validators": []}}
+
+
 class ProductRatingSerializer(serializers.ModelSerializer):
     def validate(self, data):
         if data["value"] < 0 or data["value"] > 5:
@@ -38,6 +45,22 @@ class ProductRatingSerializer(serializers.ModelSerializer):
         ]
 
 
+class BulkRatingItemSerializer(serializers.Serializer):
+    product_id = serializers.IntegerField()
+    value = serializers.IntegerField()
+    user_id = serializers.IntegerField(required=False)
+
+    def validate_value(self, value):
+        if value < 0 or value > 5:
+            raise serializers.ValidationError("must be between 0 and 5")
+        return value
+
+
+class BulkRatingRequestSerializer(serializers.Serializer):
+    ratings = serializers.ListField(
+        child=serializers.DictField(), allow_empty=False, max_length=1000)
+
+
 class ProductRatingRequestSerializer(serializers.ModelSerializer):
     class Meta:
         model = ProductRating
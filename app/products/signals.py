@@ -0,0 +1,80 @@
+from functools import partial
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import token_cache
+from .changes import next_change
+from .database import configure_sqlite
+from .metrics import install_query_recorder
+from .models import Product, ProductTombstone
+from .search import build_search_value
+from .suggest import suggest_index
+
+
+@receiver(pre_save, sender=Product)
+def update_search_value(sender, instance, **kwargs):
+    """
+    Keeps search value in sync with name, price and rating.
+    Runs for raw saves too, so fixtures loaded with loaddata are searchable.
+    """
+    instance.search_value = build_search_value(
+        instance.name, instance.price, instance.rating)
+
+
+@receiver(pre_save, sender=Product)
+def advance_change(sender, instance, update_fields=None, **kwargs):
+    """
+    Gives every saved product a new change number for the change feed.
+    Saves must run in a transaction, see next_change.
+    """
+    if update_fields is None or "change_seq" in update_fields:
+        instance.change_seq = next_change()
+
+
+@receiver(post_delete, sender=Product)
+def add_tombstone(sender, instance, **kwargs):
+    """
+    Records the deletion for the change feed, and its change number on the instance.
+    """
+    instance.change_seq = next_change()
+    ProductTombstone.objects.create(product_id=instance.pk, change_seq=instance.change_seq)
+
+
+@receiver(post_save, sender=Product)
+def update_suggest_index(sender, instance, **kwargs):
+    """
+    Applies saved product to the suggest index after commit,
+    so rolled back writes never reach it.
+    """
+    transaction.on_commit(partial(
+        suggest_index.product_changed, instance.pk, instance.name, instance.rating))
+
+
+@receiver(post_delete, sender=Product)
+def remove_from_suggest_index(sender, instance, **kwargs):
+    transaction.on_commit(partial(suggest_index.product_deleted, instance.pk))
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    token_cache.invalidate(instance.key)
+
+
+@receiver(post_save, sender=User)
+def invalidate_inactive_user_tokens(sender, instance, **kwargs):
+    if not instance.is_active:
+        token_cache.invalidate_user(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def invalidate_deleted_user_tokens(sender, instance, **kwargs):
+    token_cache.invalidate_user(instance.pk)
+
+
+connection_created.connect(install_query_recorder)
+connection_created.connect(configure_sqlite)
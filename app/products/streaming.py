@@ -0,0 +1,86 @@
+from gzip import GzipFile
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIHandler
+from django.http import StreamingHttpResponse
+from django.utils.text import StreamingBuffer
+
+
+class AsyncStreamingHttpResponse(StreamingHttpResponse):
+    """
+    Streaming response with both sync and async iterators over the same content.
+    StreamingASGIHandler sends the async one, sync servers iterate the sync one.
+    """
+
+    def __init__(self, streaming_content, async_streaming_content, *args, **kwargs):
+        super().__init__(streaming_content, *args, **kwargs)
+        self.async_streaming_content = async_streaming_content
+
+
+class StreamingASGIHandler(ASGIHandler):
+    """
+    ASGI handler that sends streaming responses without blocking the event loop.
+    Django 4.1 iterates streaming content synchronously inside the event loop,
+    where database queries are not allowed. Here sync streaming content is
+    iterated in a worker thread and AsyncStreamingHttpResponse with async for.
+    """
+
+    async def send_response(self, response, send):
+        if not response.streaming:
+            return await super().send_response(response, send)
+
+        headers = []
+        for header, value in response.items():
+            if isinstance(header, str):
+                header = header.encode("ascii")
+            if isinstance(value, str):
+                value = value.encode("latin1")
+            headers.append((bytes(header), bytes(value)))
+        for cookie in response.cookies.values():
+            headers.append(
+                (b"Set-Cookie", cookie.output(header="").encode("ascii").strip()))
+        await send({
+            "type": "http.response.start",
+            "status": response.status_code,
+            "headers": headers,
+        })
+        async for part in _stream_parts(response):
+            for chunk, _ in self.chunk_bytes(part):
+                await send({
+                    "type": "http.response.body",
+                    "body": chunk,
+                    "more_body": True,
+                })
+        await send({"type": "http.response.body"})
+        await sync_to_async(response.close, thread_sensitive=True)()
+
+
+async def _stream_parts(response):
+    if isinstance(response, AsyncStreamingHttpResponse):
+        async for part in response.async_streaming_content:
+            yield response.make_bytes(part)
+        return
+
+    end = object()
+    iterator = iter(response)
+    next_part = sync_to_async(next, thread_sensitive=True)
+    while True:
+        part = await next_part(iterator, end)
+        if part is end:
+            return
+        yield part
+
+
+async def acompress_sequence(sequence):
+    """
+    Async version of django.utils.text.compress_sequence.
+    """
+    buf = StreamingBuffer()
+    with GzipFile(mode="wb", compresslevel=6, fileobj=buf, mtime=0) as zfile:
+        yield buf.read()
+        async for item in sequence:
+            zfile.write(item)
+            data = buf.read()
+            if data:
+                yield data
+    yield buf.read()
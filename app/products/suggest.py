@@ -0,0 +1,179 @@
+import heapq
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+
+from django.conf import settings
+
+from .changes import MAX_CHANGES_PER_PAGE, changes_page, current_watermark
+from .models import Product
+from .pagination import order_products
+
+MAX_SUGGESTIONS = 50
+
+# Above every character, so prefix + LAST_CHAR bounds names starting with the prefix
+LAST_CHAR = "\U0010ffff"
+
+
+class SuggestIndex:
+    """
+    Prefix index over names of the best rated products, in memory of this process.
+    Names are kept sorted by lowercased name, so names starting with a prefix
+    are found with bisect, and ids are kept sorted by rating, so a short prefix
+    matching many names is answered by walking the best rated products instead.
+    It is built on first use and kept in sync with post_save and post_delete
+    signals. Bulk writes and writes of other processes are read from the change feed
+    every refresh_interval seconds. At most max_size products are held.
+    """
+
+    def __init__(self, max_size=None, refresh_interval=None):
+        self.max_size = max_size if max_size is not None else getattr(
+            settings, "PRODUCTS_SUGGEST_SIZE", 100000)
+        self.refresh_interval = refresh_interval if refresh_interval is not None else getattr(
+            settings, "PRODUCTS_SUGGEST_REFRESH_SECONDS", 5)
+        self._lock = threading.Lock()
+        self._reset()
+
+    def suggest(self, prefix, limit):
+        """
+        Returns (id, name, rating) of at most limit products whose name starts with prefix,
+        ignoring case, ordered by rating and id, both descending.
+        """
+        self._refresh()
+        key = prefix.lower()
+        with self._lock:
+            lo = bisect_left(self._names, key, key=str.lower)
+            hi = bisect_left(self._names, key + LAST_CHAR, key=str.lower, lo=lo)
+            # Walking by rating takes about limit * size / matches steps
+            if (hi - lo) ** 2 <= limit * len(self._names):
+                best = heapq.nsmallest(limit, range(lo, hi), key=self._rating_key)
+                return [(self._ids[i], self._names[i], self._ratings[i]) for i in best]
+            suggestions = []
+            for neg_rating, neg_id in zip(self._by_rating, self._by_rating_ids):
+                name = self._id_names[-neg_id]
+                if name.lower().startswith(key):
+                    suggestions.append((-neg_id, name, -neg_rating))
+                    if len(suggestions) == limit:
+                        break
+            return suggestions
+
+    def product_changed(self, pk, name, rating):
+        with self._lock:
+            if self._built:
+                self._apply(pk, name, rating)
+
+    def product_deleted(self, pk):
+        with self._lock:
+            if self._built:
+                self._remove(pk)
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+
+    def __len__(self):
+        return len(self._names)
+
+    def _reset(self):
+        # Sorted by lowercased name
+        self._names = []
+        self._ids = array("q")
+        self._ratings = array("d")
+        # Sorted by (-rating, -id), so best rated products come first
+        self._by_rating = array("d")
+        self._by_rating_ids = array("q")
+        self._id_names = {}
+        self._built = False
+        self._watermark = None
+        self._refreshed = 0
+        self.complete = True
+
+    def _rating_key(self, i):
+        return -self._ratings[i], -self._ids[i]
+
+    def _refresh(self):
+        now = time.monotonic()
+        with self._lock:
+            if self._built and now - self._refreshed < self.refresh_interval:
+                return
+            self._refreshed = now
+            watermark = self._watermark
+        if watermark is None:
+            return self._build()
+
+        # Many changes, like a scores run, are cheaper to rebuild than to apply one by one
+        changes = []
+        has_more = True
+        while has_more and len(changes) <= max(1000, len(self) // 10):
+            page, watermark, has_more = changes_page(watermark, MAX_CHANGES_PER_PAGE)
+            changes += page
+        if has_more:
+            return self._build()
+        with self._lock:
+            if self._watermark is None:
+                return
+            for change in changes:
+                if change.get("deleted"):
+                    self._remove(change["id"])
+                else:
+                    self._apply(change["id"], change["name"], change["rating"])
+            self._watermark = watermark
+
+    def _build(self):
+        watermark = current_watermark()
+        rows = list(order_products(Product.objects.all(), "rating", True)
+                    .values_list("id", "name", "rating")[:self.max_size + 1])
+        complete = len(rows) <= self.max_size
+        rows = rows[:self.max_size]
+        by_name = sorted(rows, key=lambda row: row[1].lower())
+        with self._lock:
+            self._reset()
+            self._names = [name for _, name, _ in by_name]
+            self._ids = array("q", (pk for pk, _, _ in by_name))
+            self._ratings = array("d", (rating for _, _, rating in by_name))
+            self._by_rating = array("d", (-rating for _, _, rating in rows))
+            self._by_rating_ids = array("q", (-pk for pk, _, _ in rows))
+            self._id_names = {pk: name for pk, name, _ in rows}
+            self._built = True
+            self._watermark = watermark
+            self._refreshed = time.monotonic()
+            self.complete = complete
+
+    def _apply(self, pk, name, rating):
+        self._remove(pk)
+        if len(self._names) >= self.max_size:
+            # Names of products beyond max_size wait for the next build
+            self.complete = False
+            return
+        i = bisect_right(self._names, name.lower(), key=str.lower)
+        self._names.insert(i, name)
+        self._ids.insert(i, pk)
+        self._ratings.insert(i, rating)
+        j = self._rating_position(-rating, -pk)
+        self._by_rating.insert(j, -rating)
+        self._by_rating_ids.insert(j, -pk)
+        self._id_names[pk] = name
+
+    def _remove(self, pk):
+        name = self._id_names.pop(pk, None)
+        if name is None:
+            return
+        key = name.lower()
+        i = bisect_left(self._names, key, key=str.lower)
+        while self._ids[i] != pk:
+            i += 1
+        j = self._rating_position(-self._ratings[i], -pk)
+        del self._names[i]
+        del self._ids[i]
+        del self._ratings[i]
+        del self._by_rating[j]
+        del self._by_rating_ids[j]
+
+    def _rating_position(self, neg_rating, neg_id):
+        lo = bisect_left(self._by_rating, neg_rating)
+        hi = bisect_right(self._by_rating, neg_rating, lo=lo)
+        return bisect_left(self._by_rating_ids, neg_id, lo, hi)
+
+
+suggest_index = SuggestIndex()
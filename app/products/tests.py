@@ -1,13 +1,43 @@
-from datetime import datetime
+import gzip
+import json
+import os
+import tempfile
+from datetime import datetime, timedelta
+from io import StringIO
+from unittest import mock
 from multiprocessing import AuthenticationError
 from telnetlib import AUTHENTICATION
 
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib.auth.models import User
-from django.test import Client, TestCase
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection, connections, transaction
+from django.http import JsonResponse
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
 
+from .authentication import TokenCache, token_cache
+from .bench import compare_results
+from .cache import product_cache
+from .changes import changes_page, next_change
+from .database import READ_REPLICA_ALIAS, ReadReplicaRouter, read_replica
+from .encoders import PRODUCT_FIELDS, compile_row_encoder, dumps
+from .filters import FILTERS, filter_products
+from .metrics import registry
 from .models import Product, ProductRating
+from .pagination import ORDERABLE_FIELDS, order_products
+from .rankings import ProductRankings, product_rankings
+from .ratings import reconcile_ratings
+from .search import search_products
 from .serializers import (CreateUserSerializer, ProductRatingSerializer,
                           ProductRequestSerializer, ProductSerializer)
+from .streaming import StreamingASGIHandler
+from .suggest import SuggestIndex, suggest_index
+from .throttling import TokenBuckets, token_buckets
 
 
 class ProductTestCase(TestCase):
@@ -117,6 +147,101 @@ class ProductTestCase(TestCase):
         self.assertEqual(
             serializer.errors["non_field_errors"][0], "user already rated this product")
 
+    def test_bench_compare_results(self):
+        result = {"throughput_rps": 100, "p50_ms": 10, "p95_ms": 20, "p99_ms": 30,
+                  "queries_per_request": 2}
+        baseline = {"endpoints": {"list": result}}
+        slower = dict(result, p95_ms=25, queries_per_request=3)
+        self.assertEqual(compare_results(baseline, {"endpoints": {"list": result}}, 0.2), [])
+        self.assertEqual(
+            compare_results(baseline, {"endpoints": {"list": slower}}, 0.2),
+            ["list p95_ms: 20 -> 25", "list queries_per_request: 2 -> 3"])
+        self.assertEqual(compare_results(baseline, {"endpoints": {}}, 0.2), ["list: missing"])
+
+
+class EncoderTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Product.objects.create(name="Cheap", price=0.05)
+        Product.objects.create(name="Round", price=5250)
+        Product.objects.create(name="Expensive", price=9999999999.99, rating=4.123456789)
+        Product.objects.create(name="Unicode \u0161\u0111\u010d", price=12.3, rating=1 / 3)
+        Product.objects.filter(name="Round").update(
+            updated_at=datetime(2022, 9, 5, 12, 0, 0))
+        Product.objects.filter(name="Cheap").update(
+            updated_at=datetime(2022, 9, 5, 12, 0, 0, 1))
+
+    @override_settings(PRODUCTS_USE_ORJSON=False)
+    def test_fast_path_same_bytes(self):
+        products = Product.objects.order_by("id")
+        expected = JsonResponse(
+            {"products": ProductSerializer(products, many=True).data}).content
+        encode_row = compile_row_encoder()
+        rows = products.values_list(*PRODUCT_FIELDS)
+        self.assertEqual(dumps({"products": [encode_row(row) for row in rows]}), expected)
+
+        for product in products:
+            row = Product.objects.values_list(*PRODUCT_FIELDS).get(pk=product.id)
+            self.assertEqual(dumps(encode_row(row)),
+                             JsonResponse(ProductSerializer(product).data).content)
+
+    @override_settings(PRODUCTS_USE_ORJSON=True)
+    def test_fast_path_orjson_same_values(self):
+        encode_row = compile_row_encoder()
+        for product in Product.objects.all():
+            row = Product.objects.values_list(*PRODUCT_FIELDS).get(pk=product.id)
+            self.assertEqual(json.loads(dumps(encode_row(row))),
+                             json.loads(JsonResponse(ProductSerializer(product).data).content))
+
+
+class QueryPlanTestCase(TestCase):
+    def test_orderings_use_index(self):
+        for order_by in ORDERABLE_FIELDS:
+            for descending in [False, True]:
+                products = order_products(Product.objects.all(), order_by, descending)
+                queries = [
+                    products.values_list(*PRODUCT_FIELDS)[20:30],
+                    search_products(products, "x").values_list(*PRODUCT_FIELDS)[:10],
+                ]
+                for queryset in queries:
+                    plan = queryset.explain()
+                    self.assertIn("USING INDEX", plan, (order_by, descending))
+                    self.assertNotIn("TEMP B-TREE", plan, (order_by, descending))
+
+    def test_filters_use_index(self):
+        for name, (field, lookup) in FILTERS.items():
+            value = "2000-01-01T00:00:00" if field == "updated_at" else "1"
+            plan = filter_products(Product.objects.all(), {name: value}).explain()
+            self.assertIn("SEARCH", plan, name)
+            self.assertIn("({}".format(field), plan, name)
+
+    def test_changes_use_index(self):
+        with CaptureQueriesContext(connection) as queries:
+            changes_page("5-3", 10)
+        selects = [query for query in queries if query["sql"].startswith("SELECT")]
+        self.assertEqual(len(selects), 2)
+        with connection.cursor() as cursor:
+            for query in selects:
+                cursor.execute("EXPLAIN QUERY PLAN " + query["sql"])
+                plan = " ".join(row[-1] for row in cursor.fetchall())
+                self.assertIn("SEARCH", plan)
+                self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_sqlite_pragmas(self):
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertEqual(cursor.fetchone()[0], 5000)
+
+    def test_read_replica_router(self):
+        router = ReadReplicaRouter()
+        self.assertIsNone(router.db_for_read(Product))
+        with read_replica():
+            self.assertIsNone(router.db_for_read(Product))
+            with mock.patch.dict(connections.databases, {READ_REPLICA_ALIAS: {}}):
+                self.assertEqual(router.db_for_read(Product), READ_REPLICA_ALIAS)
+                self.assertIsNone(router.db_for_write(Product))
+        self.assertFalse(router.allow_migrate(READ_REPLICA_ALIAS, "products"))
+
 
 class ApiTestCase(TestCase):
     @classmethod
@@ -163,6 +288,18 @@ class ApiTestCase(TestCase):
         )
 
     def setUp(self):
+        cache.clear()
+        product_cache.reset_stats()
+        token_cache.clear()
+        token_cache.reset_stats()
+        token_buckets.clear()
+        suggest_index.clear()
+        # Polls only when a test asks for it, so query counts do not depend on timing
+        poll_interval = mock.patch.object(product_cache, "poll_interval", 3600)
+        poll_interval.start()
+        self.addCleanup(poll_interval.stop)
+        product_cache.reset_polling()
+        product_cache.poll_changes(force=True)
         self.client = Client()
         response = self.client.post(
             "/login/",
@@ -184,6 +321,642 @@ class ApiTestCase(TestCase):
         self.assertEqual(len(products), 1)
         self.assertEqual(products[0]["name"], "Product 1")
 
+    def test_list_products_invalid_order_by(self):
+        for order_by in ["search_value", "rating_sum", "productrating__value"]:
+            response = self.client.get("/products/", {"order_by": order_by})
+            self.assertEqual(response.status_code, 400)
+        response = self.client.get("/products/export/", {"order_by": "nope"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_list_products_cursor(self):
+        Product.objects.create(name="Product 3", price=15.25)
+        for order in ["asc", "dsc"]:
+            for order_by in ["name", "price", "rating", "updated_at"]:
+                params = {"per_page": 2, "order_by": order_by, "order": order}
+                expected = [p["name"] for p in self.client.get(
+                    "/products/", dict(params, per_page=10)).json()["products"]]
+                names = []
+                cursor = ""
+                while cursor is not None:
+                    response = self.client.get(
+                        "/products/", dict(params, cursor=cursor)).json()
+                    names += [p["name"] for p in response["products"]]
+                    cursor = response["next_cursor"]
+                self.assertCountEqual(names, expected)
+                self.assertEqual(len(set(names)), 3)
+
+    def test_list_products_cursor_ordering(self):
+        Product.objects.create(name="Product 3", price=15.25)
+        response = self.client.get(
+            "/products/",
+            {"per_page": 1, "order_by": "price", "order": "dsc", "cursor": ""}
+        ).json()
+        self.assertEqual(response["products"][0]["name"], "Product 2")
+        response = self.client.get(
+            "/products/",
+            {"per_page": 5, "order_by": "price", "order": "dsc",
+             "cursor": response["next_cursor"]}
+        ).json()
+        self.assertEqual([p["name"] for p in response["products"]],
+                         ["Product 3", "Product 1"])
+        self.assertIsNone(response["next_cursor"])
+
+    def test_list_products_invalid_cursor(self):
+        response = self.client.get("/products/", {"cursor": "forged"})
+        self.assertEqual(response.status_code, 400)
+        cursor = self.client.get(
+            "/products/", {"per_page": 1, "cursor": ""}).json()["next_cursor"]
+        response = self.client.get(
+            "/products/", {"order_by": "price", "cursor": cursor})
+        self.assertEqual(response.status_code, 400)
+
+    def test_list_products_fields(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/products/", {"fields": "name,price"})
+        self.assertEqual(response.json()["products"][0], {"name": "Product 1", "price": "15.25"})
+        self.assertNotIn("search_value", queries[-1]["sql"])
+        self.assertNotIn("rating", queries[-1]["sql"])
+
+        response = self.client.get("/products/", {"fields": "name", "order_by": "price",
+                                                  "order": "dsc", "per_page": 1, "cursor": ""})
+        self.assertEqual(response.json()["products"], [{"name": "Product 2"}])
+        response = self.client.get("/products/", {"fields": "name", "order_by": "price",
+                                                  "order": "dsc", "per_page": 1,
+                                                  "cursor": response.json()["next_cursor"]})
+        self.assertEqual(response.json()["products"], [{"name": "Product 1"}])
+
+        # Ranked first pages, where requested fields are the queried ones
+        response = self.client.get("/products/", {"order_by": "rating", "order": "dsc",
+                                                  "fields": "id,rating"})
+        self.assertEqual([set(p) for p in response.json()["products"]], [{"id", "rating"}] * 2)
+        response = self.client.get("/products/", {"order_by": "price", "fields": "id,price"})
+        self.assertEqual([p["price"] for p in response.json()["products"]], ["15.25", "405.00"])
+        self.assertEqual([set(p) for p in response.json()["products"]], [{"id", "price"}] * 2)
+
+        response = self.client.get("/products/", {"fields": "name,secret"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_list_products_meta(self):
+        response = self.client.get("/products/")
+        self.assertNotIn("meta", response.json())
+        response = self.client.get("/products/", {"per_page": 1, "meta": "true"})
+        self.assertEqual(response.json()["meta"],
+                         {"total": 2, "page": 1, "per_page": 1, "next_page": 2})
+        response = self.client.get("/products/", {"per_page": 1, "cursor": "", "meta": "1"})
+        self.assertEqual(response.json()["meta"],
+                         {"total": 2, "next_cursor": response.json()["next_cursor"]})
+
+    def test_search_products(self):
+        response = self.client.get("/products/", {"search": "product 2"})
+        products = response.json()["products"]
+        self.assertEqual(len(products), 1)
+        self.assertEqual(products[0]["name"], "Product 2")
+
+    def test_search_products_by_price_and_rating(self):
+        response = self.client.get("/products/", {"search": "405.00"})
+        self.assertEqual(response.json()["products"][0]["name"], "Product 2")
+        response = self.client.get("/products/", {"search": "15.25 3.0"})
+        self.assertEqual(response.json()["products"][0]["name"], "Product 1")
+
+    def test_search_value_matches_product(self):
+        for product in Product.objects.all():
+            self.assertEqual(product.search_value,
+                             product._search_value().lower())
+
+    def test_search_after_update(self):
+        product = Product.objects.get(name="Product 2")
+        self.client.put(
+            "/products/{}/".format(product.id),
+            {"name": "Renamed product", "price": 1},
+            content_type="application/json"
+        )
+        response = self.client.get("/products/", {"search": "renamed"})
+        self.assertEqual(len(response.json()["products"]), 1)
+
+    def test_list_products_cached(self):
+        params = {"order_by": "price", "order": "dsc"}
+        first = self.client.get("/products/", params)
+        second = self.client.get("/products/", params)
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(product_cache.stats()["hits"], 1)
+        self.assertEqual(product_cache.stats()["misses"], 1)
+
+    def test_list_products_cache_invalidated(self):
+        self.client.get("/products/")
+        self.client.post("/products/", {"name": "Product 3", "price": 1})
+        response = self.client.get("/products/")
+        self.assertEqual(len(response.json()["products"]), 3)
+
+    def test_retrieve_product_cache_invalidated(self):
+        product = Product.objects.get(name="Product 1")
+        self.client.get("/products/{}/".format(product.id))
+        self.client.post(
+            "/products/{}/rate-product/".format(product.id),
+            {"value": 5},
+            **{"HTTP_AUTHORIZATION": "Token {}".format(self.token2)}
+        )
+        response = self.client.get("/products/{}/".format(product.id))
+        self.assertAlmostEqual(response.json()["rating"], 4)
+
+    def test_retrieve_product_not_modified(self):
+        product = Product.objects.get(name="Product 1")
+        url = "/products/{}/".format(product.id)
+        response = self.client.get(url)
+        etag = response["ETag"]
+        self.assertIn("Last-Modified", response)
+        cached = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached.content, b"")
+        cache.clear()
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])
+        self.assertEqual(response.status_code, 304)
+
+        self.client.post(
+            "/products/{}/rate-product/".format(product.id),
+            {"value": 5},
+            **{"HTTP_AUTHORIZATION": "Token {}".format(self.token2)}
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_list_products_not_modified(self):
+        params = {"order_by": "price"}
+        etag = self.client.get("/products/", params)["ETag"]
+        response = self.client.get("/products/", params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        other_page = self.client.get("/products/", {"page": 2}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(other_page.status_code, 200)
+
+        product = Product.objects.get(name="Product 2")
+        self.client.delete("/products/{}/".format(product.id))
+        response = self.client.get("/products/", params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_list_cursor_not_modified(self):
+        params = {"cursor": "", "per_page": 1, "fields": "name"}
+        with CaptureQueriesContext(connection) as queries:
+            etag = self.client.get("/products/", params)["ETag"]
+        self.assertFalse([q for q in queries if "COUNT(" in q["sql"]])
+        response = self.client.get("/products/", params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get("/products/", dict(params, meta="true"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        product = Product.objects.get(name="Product 1")
+        self.client.delete("/products/{}/".format(product.id))
+        response = self.client.get("/products/", params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["products"], [{"name": "Product 2"}])
+
+    def _admin_token(self):
+        User.objects.create_superuser("admin", password="adminpw")
+        response = self.client.post(
+            "/login/",
+            {"username": "admin", "password": "adminpw"}
+        )
+        return response.json()["token"]
+
+    def test_bulk_import_csv(self):
+        token = self._admin_token()
+        response = self.client.post(
+            "/products/bulk/",
+            "name,price\nProduct 1,20.50\nProduct 3,7\nProduct 4,abc\n",
+            content_type="text/csv",
+            **{"HTTP_AUTHORIZATION": "Token {}".format(token)}
+        )
+        self.assertEqual(response.status_code, 200)
+        result = response.json()
+        self.assertEqual(result["created"], 1)
+        self.assertEqual(result["updated"], 1)
+        self.assertEqual(result["failed"], 1)
+        self.assertEqual(result["errors"][0]["row"], 4)
+        self.assertIn("price", result["errors"][0]["errors"])
+        product = Product.objects.get(name="Product 1")
+        self.assertAlmostEqual(float(product.price), 20.5)
+        self.assertEqual(product.rating_count, 1)
+        self.assertEqual(product.search_value, product._search_value().lower())
+        self.assertTrue(Product.objects.filter(name="Product 3").exists())
+
+    def test_bulk_import_ndjson(self):
+        token = self._admin_token()
+        response = self.client.post(
+            "/products/bulk/",
+            '{"name": "Product 3", "price": 1}\nnot json\n{"name": "Product 4"}\n',
+            content_type="application/x-ndjson",
+            **{"HTTP_AUTHORIZATION": "Token {}".format(token)}
+        )
+        result = response.json()
+        self.assertEqual(result["created"], 1)
+        self.assertEqual([e["row"] for e in result["errors"]], [2, 3])
+
+    def test_bulk_import_duplicates_and_empty_body(self):
+        token = self._admin_token()
+        auth = {"HTTP_AUTHORIZATION": "Token {}".format(token)}
+        response = self.client.post(
+            "/products/bulk/", "name,price\nProduct 3,1\nProduct 1,2\nProduct 3,5\nProduct 1,3\n",
+            content_type="text/csv", **auth)
+        result = response.json()
+        self.assertEqual((result["created"], result["updated"], result["failed"]), (1, 3, 0))
+        self.assertAlmostEqual(float(Product.objects.get(name="Product 3").price), 5)
+
+        # The test client sets content type of non-empty bodies only
+        response = self.client.post("/products/bulk/", "", content_type="text/csv",
+                                    CONTENT_TYPE="text/csv", **auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"created": 0, "updated": 0, "failed": 0, "errors": []})
+
+    def test_bulk_import_unsupported_type(self):
+        token = self._admin_token()
+        response = self.client.post(
+            "/products/bulk/", {"name": "Product 3", "price": 1},
+            content_type="application/json",
+            **{"HTTP_AUTHORIZATION": "Token {}".format(token)}
+        )
+        self.assertEqual(response.status_code, 415)
+
+    def test_bulk_import_admin_only(self):
+        response = self.client.post(
+            "/products/bulk/", "name,price\nProduct 3,1\n",
+            content_type="text/csv",
+            **{"HTTP_AUTHORIZATION": "Token {}".format(self.token1)}
+        )
+        self.assertEqual(response.status_code, 403)
+
+    def test_import_products_command(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as f:
+            f.write("name,price\nProduct 2,1.99\nProduct 5,3\n")
+        out = StringIO()
+        call_command("import_products", f.name, "--batch-size", "1", stdout=out)
+        os.remove(f.name)
+        result = json.loads(out.getvalue())
+        self.assertEqual((result["created"], result["updated"]), (1, 1))
+        self.assertAlmostEqual(
+            float(Product.objects.get(name="Product 2").price), 1.99)
+
+    def test_bulk_rate(self):
+        p1 = Product.objects.get(name="Product 1")
+        p2 = Product.objects.get(name="Product 2")
+        response = self.client.post(
+            "/products/bulk-rate/",
+            {"ratings": [
+                {"product_id": p1.id, "value": 5},
+                {"product_id": p2.id, "value": 2},
+                {"product_id": p2.id, "value": 4},
+                {"product_id": 999, "value": 4},
+                {"product_id": p1.id, "value": 9},
+            ]},
+            content_type="application/json",
+            **{"HTTP_AUTHORIZATION": "Token {}".format(self.token2)}
+        )
+        self.assertEqual(response.status_code, 200)
+        result = response.json()
+        self.assertEqual(result["created"], 2)
+        self.assertEqual([e["index"] for e in result["errors"]], [2, 3, 4])
+        self.assertEqual(result["errors"][0]["errors"]["non_field_errors"][0],
+                         "user already rated this product")
+        p1.refresh_from_db()
+        p2.refresh_from_db()
+        self.assertAlmostEqual(p1.rating, 4)
+        self.assertEqual(p1.rating_count, 2)
+        self.assertAlmostEqual(p2.rating, 2)
+
+    def test_bulk_rate_for_other_users(self):
+        product = Product.objects.get(name="Product 2")
+        user1 = User.objects.get(username="user1")
+        user2 = User.objects.get(username="user2")
+        ratings = {"ratings": [
+            {"product_id": product.id, "value": 1, "user_id": user1.id},
+            {"product_id": product.id, "value": 5, "user_id": user2.id},
+        ]}
+        response = self.client.post(
+            "/products/bulk-rate/", ratings,
+            content_type="application/json",
+            **{"HTTP_AUTHORIZATION": "Token {}".format(self.token1)}
+        )
+        self.assertEqual(response.json()["created"], 1)
+
+        ratings["ratings"].pop(0)
+        response = self.client.post(
+            "/products/bulk-rate/", ratings,
+            content_type="application/json",
+            **{"HTTP_AUTHORIZATION": "Token {}".format(self._admin_token())}
+        )
+        self.assertEqual(response.json()["created"], 1)
+        product.refresh_from_db()
+        self.assertAlmostEqual(product.rating, 3)
+
+    def test_export_ndjson(self):
+        response = self.client.get(
+            "/products/export/", {"order_by": "price", "order": "dsc"})
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        rows = [json.loads(line) for line in
+                b"".join(response.streaming_content).decode().splitlines()]
+        expected = [ProductSerializer(p).data for p in
+                    Product.objects.order_by("-price")]
+        self.assertEqual(rows, json.loads(json.dumps(expected)))
+
+    def test_export_csv_search(self):
+        response = self.client.get(
+            "/products/export/", {"export_format": "csv", "search": "product 2"})
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], "id,name,price,rating,bayesian_rating,decayed_rating,updated_at")
+        self.assertEqual(len(lines), 2)
+        self.assertIn("Product 2,405.00", lines[1])
+
+    def test_export_gzip(self):
+        response = self.client.get(
+            "/products/export/", HTTP_ACCEPT_ENCODING="gzip, deflate")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        content = gzip.decompress(b"".join(response.streaming_content))
+        self.assertEqual(len(content.splitlines()), 2)
+
+    def _rate(self, token, value=4, name="Product 2"):
+        product = Product.objects.get(name=name)
+        return self.client.post(
+            "/products/{}/rate-product/".format(product.id),
+            {"value": value},
+            **{"HTTP_AUTHORIZATION": "Token {}".format(token)}
+        )
+
+    def test_token_auth_cached(self):
+        self._rate(self.token1)
+        with self.assertNumQueries(0):
+            self.client.get("/products/cache-stats/",
+                            HTTP_AUTHORIZATION="Token {}".format(self.token1))
+        stats = token_cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+
+    def test_token_auth_cache_deleted_token(self):
+        self._rate(self.token1)
+        Token.objects.filter(key=self.token1).delete()
+        self.assertIn(self._rate(self.token1, name="Product 1").status_code, [401, 403])
+
+    def test_token_auth_cache_inactive_user(self):
+        self._rate(self.token1)
+        user = User.objects.get(username="user1")
+        user.is_active = False
+        user.save()
+        self.assertIn(self._rate(self.token1, name="Product 1").status_code, [401, 403])
+
+    def test_token_cache_bounded(self):
+        cache = TokenCache(max_size=2, ttl=60)
+        for key in ["a", "b", "c"]:
+            cache.set(key, key)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.get("c"), "c")
+        expired = TokenCache(max_size=2, ttl=-1)
+        expired.set("a", "a")
+        self.assertIsNone(expired.get("a"))
+
+    def test_metrics(self):
+        registry.reset()
+        self.client.get("/products/", {"order_by": "name"})
+        self.client.get("/products/", {"order_by": "name"})
+        queries = registry.summary("db_queries", "products-list", "GET")
+        self.assertEqual(queries.count, 2)
+        self.assertEqual(queries.sum, 2)
+        size = registry.summary("response_size_bytes", "products-list", "GET")
+        self.assertGreater(size.sum, 0)
+
+        response = self.client.get("/metrics/")
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        content = response.content.decode()
+        self.assertIn('products_requests_total{endpoint="products-list",method="GET",status="200"} 2',
+                      content)
+        self.assertIn('products_request_duration_seconds{endpoint="products-list",method="GET",'
+                      'quantile="0.99"}', content)
+        self.assertIn('products_cache_hits_total{cache="responses"} 1', content)
+
+    def test_changes(self):
+        # Product 1 was rated after Product 2 was created
+        response = self.client.get("/products/changes/", {"per_page": 1})
+        data = response.json()
+        self.assertEqual([p["name"] for p in data["changes"]], ["Product 2"])
+        self.assertTrue(data["has_more"])
+        data = self.client.get("/products/changes/", {"since": data["next"]}).json()
+        self.assertEqual([p["name"] for p in data["changes"]], ["Product 1"])
+        self.assertFalse(data["has_more"])
+        since = data["next"]
+
+        product1 = Product.objects.get(name="Product 1")
+        product2 = Product.objects.get(name="Product 2")
+        self._rate(self.token2, 5, name="Product 1")
+        self.client.delete("/products/{}/".format(product2.id))
+        self.client.post("/products/", {"name": "Product 3", "price": 1})
+        data = self.client.get("/products/changes/", {"since": since}).json()
+        self.assertEqual(data["changes"][0]["id"], product1.id)
+        self.assertEqual(data["changes"][0]["rating"], 4)
+        self.assertEqual(data["changes"][1], {"id": product2.id, "deleted": True})
+        self.assertEqual(data["changes"][2]["name"], "Product 3")
+
+        data = self.client.get("/products/changes/", {"since": data["next"]}).json()
+        self.assertEqual(data["changes"], [])
+        response = self.client.get("/products/changes/", {"since": "latest"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_list_filters(self):
+        def names(params):
+            response = self.client.get("/products/", params)
+            return [p["name"] for p in response.json()["products"]]
+        self.assertEqual(names({"price_min": "100"}), ["Product 2"])
+        self.assertEqual(names({"price_max": "100", "rating_min": "1"}), ["Product 1"])
+        self.assertEqual(names({"updated_after": "2999-01-01T00:00:00Z"}), [])
+        self.assertEqual(names({"order_by": "rating", "order": "dsc", "rating_min": "2"}),
+                         ["Product 1"])
+        response = self.client.get("/products/", {"price_min": "cheap", "rating_min": "nan"})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()), {"price_min", "rating_min"})
+
+        with self.assertNumQueries(3):
+            response = self.client.get("/products/", {"facets": "rating,price"})
+        facets = response.json()["facets"]
+        self.assertEqual([b["count"] for b in facets["price"]], [0, 1, 0, 1, 0, 0])
+        self.assertEqual([b["count"] for b in facets["rating"]], [1, 0, 0, 1, 0])
+        self.assertEqual(facets["price"][-1], {"min": 1000, "max": None, "count": 0})
+        response = self.client.get("/products/", {"facets": "price", "price_min": "100"})
+        self.assertEqual([b["count"] for b in response.json()["facets"]["price"]], [0, 0, 0, 1, 0, 0])
+        response = self.client.get("/products/", {"facets": "name"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_batch(self):
+        product1 = Product.objects.get(name="Product 1")
+        product2 = Product.objects.get(name="Product 2")
+        ids = "{},999,{},{}".format(product2.id, product1.id, product2.id)
+        with self.assertNumQueries(1):
+            response = self.client.get("/products/batch/", {"ids": ids})
+        data = response.json()
+        self.assertEqual([p["name"] for p in data["products"]], ["Product 2", "Product 1"])
+        self.assertEqual(data["products"][1], self.client.get(
+            "/products/{}/".format(product1.id)).json())
+        self.assertEqual(data["missing"], [999])
+
+        response = self.client.post("/products/batch/", {"ids": [product1.id]},
+                                    content_type="application/json")
+        self.assertEqual([p["name"] for p in response.json()["products"]], ["Product 1"])
+        for ids in ["", "1,x", ",".join(str(i) for i in range(101))]:
+            response = self.client.get("/products/batch/", {"ids": ids})
+            self.assertEqual(response.status_code, 400, ids)
+        for body in [[product1.id], "1", None]:
+            response = self.client.post("/products/batch/", body, content_type="application/json")
+            self.assertEqual(response.status_code, 400, body)
+
+    def test_suggest(self):
+        response = self.client.get("/products/suggest/", {"q": "prod"})
+        self.assertEqual([s["name"] for s in response.json()["suggestions"]],
+                         ["Product 1", "Product 2"])
+        response = self.client.get("/products/suggest/", {"q": "PRODUCT 2"})
+        self.assertEqual([s["name"] for s in response.json()["suggestions"]], ["Product 2"])
+
+        product1 = Product.objects.get(name="Product 1")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post("/products/", {"name": "Probe", "price": 1})
+            self.client.delete("/products/{}/".format(product1.id))
+        with self.assertNumQueries(0):
+            response = self.client.get("/products/suggest/", {"q": "pro", "limit": 5})
+        self.assertEqual([s["name"] for s in response.json()["suggestions"]],
+                         ["Probe", "Product 2"])
+        response = self.client.get("/products/suggest/", {"q": "pro", "limit": 0})
+        self.assertEqual(response.status_code, 400)
+
+    def test_suggest_index(self):
+        with transaction.atomic():
+            change_seq = next_change()
+            Product.objects.bulk_create(
+                Product(name="{} {}".format(prefix, i), price=1, rating=i % 7, change_seq=change_seq)
+                for prefix in ["Alpha", "alps", "Beta"] for i in range(40))
+        products = list(Product.objects.values_list("id", "name", "rating"))
+
+        def expected(prefix, limit):
+            matches = [p for p in products if p[1].lower().startswith(prefix.lower())]
+            return sorted(matches, key=lambda p: (-p[2], -p[0]))[:limit]
+
+        index = SuggestIndex(refresh_interval=0)
+        # Narrow prefixes scan their matches, wide ones walk products by rating
+        for prefix in ["", "a", "alp", "ALPHA 1", "alps 39", "beta", "x"]:
+            self.assertEqual(index.suggest(prefix, 5), expected(prefix, 5), prefix)
+
+        beta = Product.objects.get(name="Beta 1")
+        beta.name = "Alpha best"
+        beta.rating = 9
+        beta.save()
+        Product.objects.get(name="Alpha 6").delete()
+        products = list(Product.objects.values_list("id", "name", "rating"))
+        for prefix in ["", "a", "alpha", "beta"]:
+            self.assertEqual(index.suggest(prefix, 5), expected(prefix, 5), prefix)
+
+        index = SuggestIndex(max_size=10)
+        self.assertEqual(index.suggest("", 3), expected("", 3))
+        self.assertEqual(len(index), 10)
+        self.assertFalse(index.complete)
+
+    @override_settings(PRODUCTS_RATING_WRITE_BEHIND=True)
+    def test_rate_product_write_behind(self):
+        product = Product.objects.get(name="Product 2")
+        self.client.get("/products/{}/".format(product.id))
+        response = self._rate(self.token1, 5)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(self._rate(self.token1, 4).status_code, 400)
+        self.assertEqual(self.client.get("/products/{}/".format(product.id)).json()["rating"], 0)
+        self.assertIn("products_rating_queue_depth 1", self.client.get("/metrics/").content.decode())
+
+        out = StringIO()
+        call_command("drain_ratings", "--once", stdout=out)
+        self.assertEqual(json.loads(out.getvalue())["drained"], 1)
+        self.assertEqual(self.client.get("/products/{}/".format(product.id)).json()["rating"], 5)
+        self.assertIn("products_rating_queue_depth 0", self.client.get("/metrics/").content.decode())
+        self.assertEqual(self._rate(self.token1, 4).status_code, 400)
+
+    @override_settings(METRICS_DETECT_N_PLUS_ONE=True, METRICS_N_PLUS_ONE_THRESHOLD=2)
+    def test_metrics_n_plus_one(self):
+        with self.assertLogs("products.metrics", "WARNING") as logs:
+            self._rate(self.token2, name="Product 1")
+        self.assertIn("products-rate-product", logs.output[0])
+
+    def test_cache_stats_admin_only(self):
+        response = self.client.get("/products/cache-stats/")
+        self.assertIn(response.status_code, [401, 403])
+
+    def test_rankings_incremental(self):
+        params = {"order_by": "rating", "order": "dsc"}
+        self.client.get("/products/", params)
+        self._rate(self.token1, 5)
+        with self.assertNumQueries(0):
+            response = self.client.get("/products/", params)
+        self.assertEqual(response.json()["products"][0]["name"], "Product 2")
+
+        product = Product.objects.get(name="Product 2")
+        self.client.delete("/products/{}/".format(product.id))
+        with self.assertNumQueries(0):
+            response = self.client.get("/products/", params)
+        self.assertEqual([p["name"] for p in response.json()["products"]], ["Product 1"])
+        self.assertEqual(product_rankings.check(), [])
+
+        # The poll skips writes this process already applied
+        version = product_cache.catalog_version()
+        product_cache.poll_interval = 0
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/products/", params)
+        self.assertEqual(product_cache.catalog_version(), version)
+        self.assertFalse([q for q in queries if 'FROM "products_product"' in q["sql"]
+                          and "ORDER BY" in q["sql"]])
+        self.assertEqual([p["name"] for p in response.json()["products"]], ["Product 1"])
+
+    def test_cache_polls_changes(self):
+        product = Product.objects.get(name="Product 2")
+        url = "/products/{}/".format(product.id)
+
+        def first():
+            response = self.client.get("/products/", {"order_by": "rating", "order": "dsc"})
+            return response.json()["products"][0]["name"]
+
+        self.assertEqual(first(), "Product 1")
+        self.assertEqual(self.client.get(url).json()["rating"], 0)
+        # Written by another process, like drain_ratings, which invalidated its own cache
+        with transaction.atomic():
+            Product.objects.filter(pk=product.id).update(rating=5, change_seq=next_change())
+        self.assertEqual(first(), "Product 1")
+        self.assertEqual(self.client.get(url).json()["rating"], 0)
+        product_cache.poll_interval = 0
+        self.assertEqual(first(), "Product 2")
+        self.assertEqual(self.client.get(url).json()["rating"], 5)
+        self.assertEqual(product_rankings.check(), [])
+
+    def test_rankings_prefix(self):
+        rankings = ProductRankings(size=2)
+        for i in range(3):
+            Product.objects.create(name="Ranked {}".format(i), price=1000 + i)
+        first_two = [row[1] for row in rankings.page("price", True, 0, 2)]
+        self.assertEqual(first_two, ["Ranked 2", "Ranked 1"])
+
+        product = Product.objects.get(name="Ranked 2")
+        pk = product.id
+        product.delete()
+        rankings.product_deleted(pk, product_cache.invalidate_catalog())
+        self.assertIsNone(rankings.page("price", True, 0, 2))
+
+        product = Product.objects.get(name="Ranked 0")
+        product.price = 2000
+        product.save()
+        rankings.product_changed(product.id, product_cache.invalidate_catalog())
+        self.assertEqual(rankings.page("price", True, 0, 1)[0][1], "Ranked 0")
+        self.assertEqual(rankings.check(), [])
+
+        Product.objects.filter(pk=product.id).update(price=1)
+        self.assertEqual(rankings.check(), [("price", False), ("price", True)])
+
+    def test_rankings_check_admin_only(self):
+        response = self.client.get("/products/rankings-check/")
+        self.assertIn(response.status_code, [401, 403])
+        token = self._admin_token()
+        response = self.client.get(
+            "/products/rankings-check/", HTTP_AUTHORIZATION="Token {}".format(token))
+        self.assertEqual(response.json(), {"mismatched": []})
+
     def test_retreive_product(self):
         product = Product.objects.get(name="Product 1")
         response = self.client.get("/products/{}/".format(product.id))
@@ -201,6 +974,19 @@ class ApiTestCase(TestCase):
         self.assertEqual(updated_product.name, "Product new name")
         self.assertAlmostEqual(float(updated_product.price), 99.99)
 
+    def test_update_product_keeps_rating_aggregates(self):
+        product = Product.objects.get(name="Product 1")
+        url = "/products/{}/".format(product.id)
+        response = self.client.put(url, {"rating_count": 1000, "rating_sum": 5, "rating": 1,
+                                         "price": 2}, content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        product.refresh_from_db()
+        self.assertEqual((product.rating_count, product.rating_sum, product.rating), (1, 3, 3))
+        self.assertAlmostEqual(float(product.price), 2)
+        self.assertEqual(reconcile_ratings(fix=False), [])
+        response = self.client.put(url, {"price": "x"}, content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+
     def test_delete_product(self):
         product = Product.objects.get(name="Product 2")
         response = self.client.delete("/products/{}/".format(product.id))
@@ -225,3 +1011,195 @@ class ApiTestCase(TestCase):
             **{"HTTP_AUTHORIZATION": "Token {}".format(self.token2)}
         )
         self.assertAlmostEqual(response.json()["rating"], 3.5)
+        product.refresh_from_db()
+        self.assertEqual(product.rating_count, 2)
+        self.assertEqual(product.rating_sum, 7)
+        self.assertEqual(product.search_value, product._search_value().lower())
+
+    def test_rate_product_writes_product_once(self):
+        with CaptureQueriesContext(connection) as queries:
+            self._rate(self.token2, name="Product 1")
+        product_writes = [q for q in queries if q["sql"].startswith('UPDATE "products_product"')]
+        self.assertEqual(len(product_writes), 1)
+
+    def test_rate_product_twice(self):
+        product = Product.objects.get(name="Product 1")
+        response = self.client.post(
+            "/products/{}/rate-product/".format(product.id),
+            {"value": 5},
+            **{"HTTP_AUTHORIZATION": "Token {}".format(self.token1)}
+        )
+        self.assertEqual(response.status_code, 400)
+        product.refresh_from_db()
+        self.assertEqual(product.rating_count, 1)
+        self.assertAlmostEqual(product.rating, 3)
+
+    def test_reconcile_ratings(self):
+        product = Product.objects.get(name="Product 1")
+        Product.objects.filter(pk=product.id).update(
+            rating_count=10, rating_sum=12, rating=1.2)
+        out = StringIO()
+        call_command("reconcile_ratings", stdout=out)
+        self.assertIn("1 products reconciled", out.getvalue())
+        product.refresh_from_db()
+        self.assertEqual(product.rating_count, 1)
+        self.assertEqual(product.rating_sum, 3)
+        self.assertAlmostEqual(product.rating, 3)
+        self.assertEqual(product.search_value,
+                         product._search_value().lower())
+
+    def test_compute_scores(self):
+        product1 = Product.objects.get(name="Product 1")
+        product2 = Product.objects.get(name="Product 2")
+        self._rate(self.token1, 5, "Product 2")
+        self._rate(self.token2, 1, "Product 2")
+        now = timezone.now()
+        ProductRating.objects.update(created_at=now)
+        ProductRating.objects.filter(product_id=product2, value=1).update(
+            created_at=now - timedelta(days=1))
+        out = StringIO()
+        call_command("compute_scores", "--chunk-size", "2", "--prior-weight", "1",
+                     "--half-life-days", "1", stdout=out)
+        self.assertEqual(json.loads(out.getvalue())["products"], 2)
+
+        # Ratings are 3, 5 and 1, so the global mean is 3
+        product1.refresh_from_db()
+        product2.refresh_from_db()
+        self.assertAlmostEqual(product1.bayesian_rating, (3 + 3) / 2)
+        self.assertAlmostEqual(product2.bayesian_rating, (3 + 5 + 1) / 3)
+        self.assertAlmostEqual(product2.decayed_rating, (3 + 5 + 0.5) / 2.5, places=3)
+        response = self.client.get("/products/", {"order_by": "decayed_rating", "order": "dsc"})
+        self.assertEqual(response.json()["products"][0]["name"], "Product 2")
+
+    def test_seed_catalog(self):
+        out = StringIO()
+        call_command("seed_catalog", "--products", "20", "--users", "10",
+                     "--ratings", "150", "--seed", "7", "--prefix", "a", stdout=out)
+        self.assertEqual(json.loads(out.getvalue())["ratings"], 150)
+        call_command("seed_catalog", "--products", "20", "--users", "10",
+                     "--ratings", "150", "--seed", "7", "--prefix", "b", stdout=StringIO())
+        self.assertEqual(ProductRating.objects.filter(product_id__name__startswith="a ").count(), 150)
+        self.assertEqual(reconcile_ratings(fix=False), [])
+
+        def catalog(prefix):
+            return list(Product.objects.filter(name__startswith=prefix + " ")
+                        .order_by("id").values_list("price", "rating_count", "rating_sum"))
+        self.assertEqual(catalog("a"), catalog("b"))
+        counts = sorted((count for _, count, _ in catalog("a")), reverse=True)
+        self.assertLessEqual(counts[0], 10)
+        self.assertGreater(counts[0], counts[-1])
+        with self.assertRaises(CommandError):
+            call_command("seed_catalog", "--products", "2", "--users", "1",
+                         "--ratings", "1", "--prefix", "a", stdout=StringIO())
+
+    @override_settings(REST_FRAMEWORK=dict(
+        settings.REST_FRAMEWORK, DEFAULT_THROTTLE_RATES={"write": "2/min"}))
+    def test_write_throttle(self):
+        anonymous = Client()
+        for i in range(2):
+            response = anonymous.post("/products/", {"name": "New {}".format(i), "price": 1})
+            self.assertEqual(response.status_code, 201)
+        response = anonymous.post("/products/", {"name": "New 2", "price": 1})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(int(response["Retry-After"]), 30)
+        self.assertEqual(anonymous.get("/products/").status_code, 200)
+
+        # Authenticated user has a bucket of its own
+        self.assertEqual(self._rate(self.token2).status_code, 201)
+
+    def test_token_buckets(self):
+        buckets = TokenBuckets(max_size=2)
+        self.assertEqual(buckets.consume("a", 1, 0.5), 0)
+        self.assertAlmostEqual(buckets.consume("a", 1, 0.5), 2, places=2)
+        buckets.consume("b", 1, 0.5)
+        buckets.consume("c", 1, 0.5)
+        self.assertEqual(len(buckets), 2)
+        # Evicted bucket starts full again
+        self.assertEqual(buckets.consume("a", 1, 0.5), 0)
+
+
+class AsyncApiTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(15):
+            Product.objects.create(name="Product {}".format(i), price=i * 1.5, rating=i % 4)
+
+    def setUp(self):
+        cache.clear()
+
+    async def test_list_same_as_sync(self):
+        queries = [
+            {},
+            {"per_page": 4, "page": 3, "order_by": "price", "order": "dsc"},
+            {"search": "product 1", "order_by": "rating"},
+            {"page": 99},
+            {"per_page": 5, "cursor": ""},
+            {"order_by": "nope"},
+            {"fields": "id,name", "per_page": 3, "meta": "true"},
+            {"fields": "price", "order_by": "rating", "order": "dsc"},
+            {"fields": "price", "cursor": "", "meta": "true"},
+            {"price_min": "10", "rating_min": "1", "facets": "price,rating"},
+            {"cursor": "", "facets": "rating", "updated_after": "2000-01-01T00:00:00"},
+            {"price_max": "x"},
+            {"facets": "nope"},
+        ]
+        for query in queries:
+            response = await self.async_client.get("/async/products/", query)
+            expected = await sync_to_async(Client().get)("/products/", query)
+            self.assertEqual(response.status_code, expected.status_code)
+            self.assertEqual(response.content, expected.content)
+
+    async def test_retrieve_same_as_sync(self):
+        product = await Product.objects.aget(name="Product 3")
+        response = await self.async_client.get("/async/products/{}/".format(product.id))
+        expected = await sync_to_async(Client().get)("/products/{}/".format(product.id))
+        self.assertEqual(response.content, expected.content)
+        self.assertEqual(response["ETag"], expected["ETag"])
+        response = await self.async_client.get(
+            "/async/products/{}/".format(product.id), **{"If-None-Match": expected["ETag"]})
+        self.assertEqual(response.status_code, 304)
+        response = await self.async_client.get("/async/products/9999/")
+        self.assertEqual(response.status_code, 404)
+
+    async def test_export_same_as_sync(self):
+        response = await self.async_client.get(
+            "/async/products/export/", {"export_format": "csv", "order_by": "price"})
+        content = b"".join([chunk async for chunk in response.async_streaming_content])
+        expected = await sync_to_async(lambda: b"".join(Client().get(
+            "/products/export/", {"export_format": "csv", "order_by": "price"}
+        ).streaming_content))()
+        self.assertEqual(content, expected)
+
+    async def test_metrics_count_async_queries(self):
+        registry.reset()
+        await self.async_client.get("/async/products/", {"page": 2})
+        queries = registry.summary(
+            "db_queries", "products.async_views.product_list", "GET")
+        self.assertEqual(queries.sum, 2)
+
+    def test_export_sync_server(self):
+        response = self.client.get("/async/products/export/")
+        lines = b"".join(response.streaming_content).splitlines()
+        self.assertEqual(len(lines), 15)
+
+    async def test_asgi_handler_streams_export(self):
+        messages = []
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            messages.append(message)
+
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+            "method": "GET", "scheme": "http", "path": "/async/products/export/",
+            "raw_path": b"/async/products/export/", "query_string": b"",
+            "root_path": "", "headers": [(b"host", b"testserver"),
+                                         (b"accept-encoding", b"gzip")],
+            "client": ("127.0.0.1", 1), "server": ("testserver", 80),
+        }
+        await StreamingASGIHandler()(scope, receive, send)
+        self.assertEqual(messages[0]["status"], 200)
+        body = b"".join(m.get("body", b"") for m in messages[1:])
+        self.assertEqual(len(gzip.decompress(body).splitlines()), 15)
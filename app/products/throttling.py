@@ -0,0 +1,123 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_rate(rate):
+    """
+    Returns (capacity, tokens per second) of a rate like "60/min".
+    """
+    count, period = rate.split("/")
+    return int(count), int(count) / PERIODS[period[0]]
+
+
+class TokenBuckets:
+    """
+    Bounded LRU map of key to (tokens, last refill time) in process memory.
+    Buckets are refilled lazily when they are used.
+    Evicted buckets start full again.
+    """
+
+    def __init__(self, max_size=None):
+        self.max_size = max_size if max_size is not None else getattr(
+            settings, "THROTTLE_BUCKETS_SIZE", 10000)
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consume(self, key, capacity, refill_rate):
+        """
+        Takes a token from the bucket of key.
+        Returns 0 if it was taken, otherwise seconds until a token is available.
+        """
+        now = time.monotonic()
+        with self._lock:
+            tokens, refilled = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - refilled) * refill_rate)
+            wait = 0 if tokens >= 1 else (1 - tokens) / refill_rate
+            self._buckets[key] = (tokens - 1 if wait == 0 else tokens, now)
+            self._buckets.move_to_end(key)
+            if len(self._buckets) > self.max_size:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class CacheTokenBuckets:
+    """
+    Token buckets kept in a Django cache, shared by every process using it.
+    Read and write of a bucket are not atomic, so concurrent requests
+    of one key in different processes may take a few tokens too many.
+    """
+
+    def __init__(self, alias):
+        self.alias = alias
+
+    def consume(self, key, capacity, refill_rate):
+        cache = caches[self.alias]
+        cache_key = "throttle:{}".format(key)
+        now = time.time()
+        tokens, refilled = cache.get(cache_key, (capacity, now))
+        tokens = min(capacity, tokens + max(0, now - refilled) * refill_rate)
+        wait = 0 if tokens >= 1 else (1 - tokens) / refill_rate
+        # Full bucket is the same as a missing one, so it can expire then
+        cache.set(cache_key, (tokens - 1 if wait == 0 else tokens, now),
+                  timeout=int(capacity / refill_rate) + 1)
+        return wait
+
+    def clear(self):
+        caches[self.alias].clear()
+
+
+def default_buckets():
+    alias = getattr(settings, "THROTTLE_CACHE_ALIAS", None)
+    return CacheTokenBuckets(alias) if alias else TokenBuckets()
+
+
+token_buckets = default_buckets()
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Throttles unsafe requests per user, or per IP address of anonymous
+    requests, with token buckets of the rate of throttle scope of the view,
+    "write" by default. Views without a configured rate are not throttled.
+    """
+
+    scope = "write"
+    buckets = None
+
+    def __init__(self):
+        self._wait = None
+
+    def allow_request(self, request, view):
+        if request.method in SAFE_METHODS:
+            return True
+        scope = getattr(view, "throttle_scope", self.scope)
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(scope)
+        if rate is None:
+            return True
+        capacity, refill_rate = parse_rate(rate)
+        if request.user and request.user.is_authenticated:
+            ident = "user:{}".format(request.user.pk)
+        else:
+            ident = "ip:{}".format(self.get_ident(request))
+        buckets = token_buckets if self.buckets is None else self.buckets
+        self._wait = buckets.consume("{}:{}".format(scope, ident), capacity, refill_rate)
+        return self._wait == 0
+
+    def wait(self):
+        return self._wait
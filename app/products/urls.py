@@ -2,7 +2,7 @@ from django.urls import path
 from rest_framework.authtoken.views import obtain_auth_token
 from rest_framework.routers import DefaultRouter
 
-from . import views
+from . import async_views, views
 
 router = DefaultRouter()
 router.register('products', views.ProductViewSet, basename="products")
@@ -10,5 +10,9 @@ router.register('products', views.ProductViewSet, basename="products")
 urlpatterns = [
     path('register/', views.user_create),
     path('login/', obtain_auth_token),
+    path('metrics/', views.metrics),
+    path('async/products/', async_views.product_list),
+    path('async/products/export/', async_views.product_export),
+    path('async/products/<int:pk>/', async_views.product_detail),
 ]
 urlpatterns += router.urls
@@ -1,19 +1,279 @@
-from datetime import datetime
 from itertools import product
 
+from django.conf import settings
 from django.core.paginator import Paginator
-from django.http import HttpResponse, JsonResponse
+from django.db import transaction
+from django.db.models import Count, Max
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
 from drf_spectacular.utils import OpenApiParameter, extend_schema
 from rest_framework import status
 from rest_framework.decorators import action, api_view
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.viewsets import ViewSet
 
+from .authentication import token_cache
+from .cache import product_cache
+from .changes import MAX_CHANGES_PER_PAGE, InvalidWatermark, changes_page
+from .conditional import (cache_entry, cached_entry_response, list_validators,
+                          not_modified_response, page_validators, row_validators,
+                          set_validators)
+from .database import use_read_replica
+from .encoders import PRODUCT_FIELDS, dumps, encode_rows
+from .export import EXPORT_FORMATS, export_stream
+from .filters import FACETS, InvalidFilter, facet_buckets, facet_names, filter_products, has_filters
+from .importer import import_products, iter_stream_lines, read_csv, read_ndjson
+from .metrics import registry, timed_serialization
 from .models import Product
-from .serializers import (CreateUserSerializer, ProductRatingRequestSerializer,
+from .pagination import (ORDERABLE_FIELDS, InvalidCursor, cursor_page, order_products,
+                         wants_meta)
+from .rankings import product_rankings
+from .ratings import add_rating, add_ratings, enqueue_rating, rating_queue_depth
+from .search import search_products
+from .serializers import (BulkRatingItemSerializer, BulkRatingRequestSerializer,
+                          CreateUserSerializer, ProductRatingRequestSerializer,
                           ProductRatingSerializer, ProductRequestSerializer,
                           ProductSerializer)
+from .suggest import MAX_SUGGESTIONS, suggest_index
+
+
+def json_response(data, status_code=status.HTTP_200_OK):
+    with timed_serialization():
+        content = dumps(data)
+    return HttpResponse(content, content_type="application/json", status=status_code)
+
+
+def invalid_order_by_response():
+    return JsonResponse(
+        {"order_by": "must be one of {}".format(", ".join(ORDERABLE_FIELDS))},
+        status=status.HTTP_400_BAD_REQUEST)
+
+
+def invalid_export_format_response():
+    return JsonResponse(
+        {"export_format": "must be one of {}".format(", ".join(EXPORT_FORMATS))},
+        status=status.HTTP_400_BAD_REQUEST)
+
+
+def invalid_fields_response():
+    return JsonResponse(
+        {"fields": "must be a comma separated list of {}".format(", ".join(PRODUCT_FIELDS))},
+        status=status.HTTP_400_BAD_REQUEST)
+
+
+def invalid_facets_response():
+    return JsonResponse(
+        {"facets": "must be a comma separated list of {}".format(", ".join(FACETS))},
+        status=status.HTTP_400_BAD_REQUEST)
+
+
+def invalid_per_page_response():
+    return JsonResponse({"per_page": "must be a positive integer"},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+
+def list_fields(params, order_by):
+    """
+    Returns (queried fields, output fields) for ?fields= of a list query,
+    or None if it names an unknown field.
+    Queried fields also have id and order_by, which cursors are built from.
+    """
+    requested = {name.strip() for name in params.get("fields", "").split(",") if name.strip()}
+    if not requested:
+        return PRODUCT_FIELDS, None
+    if not requested <= set(PRODUCT_FIELDS):
+        return None
+    queried = tuple(name for name in PRODUCT_FIELDS
+                    if name in requested or name in ("id", order_by))
+    output = tuple(name for name in PRODUCT_FIELDS if name in requested)
+    return queried, output if output != queried else None
+
+
+def page_meta(page):
+    return {
+        "total": page.paginator.count,
+        "page": page.number,
+        "per_page": page.paginator.per_page,
+        "next_page": page.next_page_number() if page.has_next() else None,
+    }
+
+
+def query_products(params):
+    """
+    Returns (products, order_by, descending) for list query parameters.
+    Products are filtered by search and range filters, but not ordered yet.
+    Raises InvalidFilter if a range filter is invalid.
+    """
+    products = filter_products(Product.objects.all(), params)
+    order_by = params.get("order_by") or "name"
+    descending = params.get("order") == "dsc"
+
+    search_word = params.get("search")
+    if search_word and len(search_word.strip()) > 0:
+        products = search_products(products, search_word)
+    return products, order_by, descending
+
+
+def list_query(params):
+    """
+    Returns ((products, order_by, descending, fields, facets), None) for list query
+    parameters, or (None, error response) if they are invalid.
+    Shared by the sync and async list views, which only differ in running the queries.
+    """
+    try:
+        products, order_by, descending = query_products(params)
+    except InvalidFilter as e:
+        return None, JsonResponse(e.errors, status=status.HTTP_400_BAD_REQUEST)
+    if order_by not in ORDERABLE_FIELDS:
+        return None, invalid_order_by_response()
+    fields = list_fields(params, order_by)
+    if fields is None:
+        return None, invalid_fields_response()
+    facets = facet_names(params)
+    if facets is None:
+        return None, invalid_facets_response()
+    return (products, order_by, descending, fields, facets), None
+
+
+def numbered_page(params, count):
+    return Paginator(range(count), params.get("per_page", 10)).get_page(params.get("page", 1))
+
+
+def numbered_page_rows(products, order_by, descending, fields, page):
+    """
+    Returns query for value tuples of queried fields on a numbered page.
+    """
+    return order_products(products, order_by, descending).values_list(*fields[0])[
+        page.object_list.start:page.object_list.stop]
+
+
+def numbered_page_response(request, page, rows, fields, facets, validators):
+    data = {"products": encode_rows(rows, *fields)}
+    if wants_meta(request.GET):
+        data["meta"] = page_meta(page)
+    if facets:
+        data["facets"] = facets
+    return set_validators(json_response(data), *validators)
+
+
+def cursor_page_response(request, rows, next_cursor, fields, total, facets):
+    """
+    Returns a cursor page of rows of cursor_fields, with meta if total is given.
+    """
+    queried = cursor_fields(fields[0])
+    data = {
+        "products": encode_rows(rows, queried, fields[1] or fields[0]),
+        "next_cursor": next_cursor,
+    }
+    if total is not None:
+        data["meta"] = {"total": total, "next_cursor": next_cursor}
+    if facets:
+        data["facets"] = facets
+    return page_response(request, rows, queried, data)
+
+
+def list_watermark(products):
+    """
+    Returns {"count", "last_updated"} of filtered products from one query.
+    """
+    return products.aggregate(count=Count("id"), last_updated=Max("updated_at"))
+
+
+def ranked_rows(params, order_by, descending):
+    """
+    Returns rows of a list page from product_rankings,
+    or None if the page has to be queried.
+    """
+    if "cursor" in params or (params.get("search") or "").strip() or wants_meta(params) \
+            or has_filters(params) or params.get("facets"):
+        return None
+    try:
+        page = int(params.get("page", 1))
+        per_page = int(params.get("per_page", 10))
+    except ValueError:
+        return None
+    if page < 1 or per_page < 1:
+        return None
+    rows = product_rankings.page(order_by, descending, (page - 1) * per_page, per_page)
+    if not rows and page > 1:
+        return None
+    return rows
+
+
+def ranked_response(request, rows, output):
+    return page_response(
+        request, rows, PRODUCT_FIELDS, {"products": encode_rows(rows, PRODUCT_FIELDS, output)})
+
+
+def page_response(request, rows, fields, data):
+    """
+    Returns a list page with an ETag built from its rows, or 304 if it did not change,
+    so it needs no aggregate query over the filtered products.
+    Meta and facets of the page, when they are requested, are part of the ETag.
+    """
+    etag, last_modified = page_validators(
+        request.GET, rows, fields, extra=(data.get("meta"), data.get("facets")))
+    not_modified = not_modified_response(request, etag, last_modified)
+    if not_modified is not None:
+        return not_modified
+    return set_validators(json_response(data), etag, last_modified)
+
+
+def cursor_fields(fields):
+    """
+    Returns queried fields of a cursor page, with updated_at its ETag is built from.
+    """
+    return fields if "updated_at" in fields else fields + ("updated_at",)
+
+
+def cursor_per_page(params):
+    """
+    Returns per_page of cursor pagination, or None if it is invalid.
+    """
+    try:
+        per_page = int(params.get("per_page", 10))
+    except ValueError:
+        return None
+    return per_page if per_page > 0 else None
+
+
+def batch_ids(value):
+    """
+    Returns unique ids of a batch read in requested order, from a comma separated
+    string or a list, or None if they are invalid or too many.
+    """
+    if isinstance(value, str):
+        value = [part for part in value.split(",") if part.strip()]
+    if not isinstance(value, list) or not 0 < len(value) <= MAX_BATCH_IDS:
+        return None
+    try:
+        ids = [int(pk) for pk in value]
+    except (TypeError, ValueError):
+        return None
+    return list(dict.fromkeys(ids))
+
+
+def set_export_headers(response, export_format, gzip):
+    response["Content-Disposition"] = 'attachment; filename="products.{}"'.format(export_format)
+    response["Vary"] = "Accept-Encoding"
+    if gzip:
+        response["Content-Encoding"] = "gzip"
+    return response
+
+
+def accepts_gzip(request):
+    return "gzip" in request.META.get("HTTP_ACCEPT_ENCODING", "")
+
+
+# Ids of one batch read, like a cart or a recommendation list
+MAX_BATCH_IDS = 100
+
+IMPORT_READERS = {
+    "text/csv": read_csv,
+    "application/x-ndjson": read_ndjson,
+    "application/jsonl": read_ndjson,
+}
 
 
 class ProductViewSet(ViewSet):
@@ -26,38 +286,186 @@ class ProductViewSet(ViewSet):
         OpenApiParameter(
             name="page", description="Current page number", location="query"),
         OpenApiParameter(
-            name="order_by", description="Field by which the results are ordered", location="query"),
+            name="order_by", description="Field by which the results are ordered", location="query",
+            enum=ORDERABLE_FIELDS),
         OpenApiParameter(
             name="order", description="Ordering direction", location="query"),
         OpenApiParameter(
-            name="search", description="Search products by any field", location="query")
+            name="search", description="Search products by any field", location="query"),
+        OpenApiParameter(
+            name="cursor", description="Cursor of the next page, empty for the first page. "
+            "Enables cursor pagination instead of page numbers", location="query"),
+        OpenApiParameter(
+            name="fields", description="Comma separated fields of returned products, "
+            "all by default", location="query"),
+        OpenApiParameter(
+            name="meta", description="true to add total count and next page to the response",
+            location="query"),
+        OpenApiParameter(
+            name="price_min", description="Lowest price, inclusive", location="query"),
+        OpenApiParameter(
+            name="price_max", description="Highest price, inclusive", location="query"),
+        OpenApiParameter(
+            name="rating_min", description="Lowest rating, inclusive", location="query"),
+        OpenApiParameter(
+            name="updated_after", description="Products updated after this ISO date and time",
+            location="query"),
+        OpenApiParameter(
+            name="facets", description="Comma separated histograms to add to the response, "
+            "of {}".format(", ".join(FACETS)), location="query"),
     ])
+    @use_read_replica
     def list(self, request):
         """
         Returns list of products, based on the query
         """
-        products = Product.objects.all()
-        if request.GET.get("order_by"):
-            order_value = request.GET.get("order_by")
-            if request.GET.get("order") == "dsc":
-                order_value = "-" + order_value
-            products = products.order_by(order_value)
+        return self._cached_response(
+            request, product_cache.list_key(request.GET), lambda: self._list(request))
+
+    def _list(self, request):
+        query, error = list_query(request.GET)
+        if error is not None:
+            return error
+        products, order_by, descending, fields, facets = query
+        rows = ranked_rows(request.GET, order_by, descending)
+        if rows is not None:
+            return ranked_response(request, rows, fields[1] or fields[0])
+        if "cursor" in request.GET:
+            return self._list_cursor(request, query)
+        watermark = list_watermark(products)
+        validators = list_validators(request.GET, **watermark)
+        not_modified = not_modified_response(request, *validators)
+        if not_modified is not None:
+            return not_modified
+        page = numbered_page(request.GET, watermark["count"])
+        rows = list(numbered_page_rows(products, order_by, descending, fields, page))
+        return numbered_page_response(
+            request, page, rows, fields, facet_buckets(products, facets), validators)
+
+    def _list_cursor(self, request, query):
+        products, order_by, descending, fields, facets = query
+        per_page = cursor_per_page(request.GET)
+        if per_page is None:
+            return invalid_per_page_response()
+        try:
+            rows, next_cursor = cursor_page(products, order_by, descending, request.GET["cursor"],
+                                            per_page, cursor_fields(fields[0]))
+        except InvalidCursor as e:
+            return JsonResponse({"cursor": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        # Total is the only part of a cursor page that needs a COUNT query
+        total = products.count() if wants_meta(request.GET) else None
+        return cursor_page_response(
+            request, rows, next_cursor, fields, total, facet_buckets(products, facets))
+
+    @extend_schema(parameters=[
+        OpenApiParameter(
+            name="export_format", description="ndjson (default) or csv", location="query"),
+        OpenApiParameter(
+            name="order_by", description="Field by which the results are ordered", location="query",
+            enum=ORDERABLE_FIELDS),
+        OpenApiParameter(
+            name="order", description="Ordering direction", location="query"),
+        OpenApiParameter(
+            name="search", description="Search products by any field", location="query")
+    ])
+    @action(detail=False, methods=["GET"], url_path="export")
+    def export(self, request):
+        """
+        Streams all products, based on the query, as NDJSON or CSV.
+        Response is gzipped if client accepts it.
+        """
+        export_format = request.GET.get("export_format", "ndjson")
+        if export_format not in EXPORT_FORMATS:
+            return invalid_export_format_response()
+        try:
+            products, order_by, descending = query_products(request.GET)
+        except InvalidFilter as e:
+            return JsonResponse(e.errors, status=status.HTTP_400_BAD_REQUEST)
+        if order_by not in ORDERABLE_FIELDS:
+            return invalid_order_by_response()
+        products = order_products(products, order_by, descending)
+
+        gzip = accepts_gzip(request)
+        chunks, content_type = export_stream(products, export_format, gzip)
+        return set_export_headers(
+            StreamingHttpResponse(chunks, content_type=content_type), export_format, gzip)
+
+    @extend_schema(parameters=[
+        OpenApiParameter(
+            name="since", description="Watermark returned as next by the previous call, "
+            "empty to get every product", location="query"),
+        OpenApiParameter(
+            name="per_page", description="Changes per page, at most {}".format(MAX_CHANGES_PER_PAGE),
+            location="query"),
+    ])
+    @action(detail=False, methods=["GET"], url_path="changes")
+    @use_read_replica
+    def changes(self, request):
+        """
+        Returns products created or updated and ids of products deleted after the watermark,
+        in the order they were written, with the watermark to pass as since next time.
+        """
+        per_page = cursor_per_page(request.GET)
+        if per_page is None:
+            return JsonResponse({"per_page": "must be a positive integer"},
+                                status=status.HTTP_400_BAD_REQUEST)
+        try:
+            changes, watermark, has_more = changes_page(
+                request.GET.get("since"), min(per_page, MAX_CHANGES_PER_PAGE))
+        except InvalidWatermark as e:
+            return JsonResponse({"since": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return json_response({"changes": changes, "next": watermark, "has_more": has_more})
+
+    @extend_schema(parameters=[
+        OpenApiParameter(
+            name="q", description="Start of product name, case is ignored", location="query"),
+        OpenApiParameter(
+            name="limit", description="Number of suggestions, at most {}".format(MAX_SUGGESTIONS),
+            location="query"),
+    ])
+    @action(detail=False, methods=["GET"], url_path="suggest")
+    def suggest(self, request):
+        """
+        Returns best rated products whose name starts with q, for typeahead.
+        Served from a prefix index in memory, so most requests make no query.
+        """
+        try:
+            limit = int(request.GET.get("limit", 10))
+        except ValueError:
+            limit = 0
+        if not 0 < limit <= MAX_SUGGESTIONS:
+            return JsonResponse(
+                {"limit": "must be between 1 and {}".format(MAX_SUGGESTIONS)},
+                status=status.HTTP_400_BAD_REQUEST)
+        suggestions = suggest_index.suggest(request.GET.get("q", ""), limit)
+        return json_response({"suggestions": [
+            {"id": pk, "name": name, "rating": rating} for pk, name, rating in suggestions]})
+
+    @extend_schema(parameters=[
+        OpenApiParameter(
+            name="ids", description="Comma separated product ids, at most {}. "
+            "POST takes them as a JSON list in ids".format(MAX_BATCH_IDS), location="query"),
+    ])
+    @action(detail=False, methods=["GET", "POST"], url_path="batch", throttle_classes=[])
+    @use_read_replica
+    def batch(self, request):
+        """
+        Returns products with given ids in requested order, read by one query,
+        and ids of products that do not exist.
+        """
+        if request.method == "POST":
+            ids = batch_ids(request.data.get("ids")) if isinstance(request.data, dict) else None
         else:
-            products = products.order_by("name")
-
-        search_word = request.GET.get("search")
-        if search_word and len(search_word.strip()) > 0:
-            products = list(filter(
-                lambda p: search_word.lower() in p._search_value().lower(),
-                products
-            ))
-
-        per_page = request.GET.get("per_page", 10)
-        page = request.GET.get("page", 1)
-        paginator = Paginator(products, per_page)
-        page_objects = paginator.get_page(page)
-        serializer = ProductSerializer(page_objects, many=True)
-        return JsonResponse({"products": serializer.data})
+            ids = batch_ids(request.GET.get("ids", ""))
+        if ids is None:
+            return JsonResponse(
+                {"ids": "must be a list of 1 to {} product ids".format(MAX_BATCH_IDS)},
+                status=status.HTTP_400_BAD_REQUEST)
+        rows = {row[0]: row for row in self.queryset.filter(id__in=ids).values_list(*PRODUCT_FIELDS)}
+        return json_response({
+            "products": encode_rows([rows[pk] for pk in ids if pk in rows]),
+            "missing": [pk for pk in ids if pk not in rows],
+        })
 
     @extend_schema(request=ProductRequestSerializer)
     def create(self, request):
@@ -66,17 +474,30 @@ class ProductViewSet(ViewSet):
         """
         create_serializer = ProductRequestSerializer(data=request.data)
         if create_serializer.is_valid():
-            product = create_serializer.save()
+            with transaction.atomic():
+                product = create_serializer.save()
+            version = product_cache.invalidate_catalog(product.change_seq)
+            product_rankings.product_changed(product.id, version)
             return JsonResponse(ProductSerializer(product).data, status=status.HTTP_201_CREATED)
         else:
             return JsonResponse(create_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @use_read_replica
     def retrieve(self, request, pk=None):
         """
         Returns a product with given id
         """
-        product = get_object_or_404(self.queryset, pk=pk)
-        return JsonResponse(ProductSerializer(product).data)
+        def build_response():
+            row = get_object_or_404(self.queryset.values_list(*PRODUCT_FIELDS), pk=pk)
+            etag, last_modified = row_validators(row)
+            not_modified = not_modified_response(request, etag, last_modified)
+            if not_modified is not None:
+                return not_modified
+            return set_validators(json_response(encode_rows([row])[0]), etag, last_modified)
+
+        if not str(pk).isdigit():
+            return build_response()
+        return self._cached_response(request, product_cache.product_key(int(pk)), build_response)
 
     @extend_schema(request=ProductRequestSerializer)
     def update(self, request, pk=None):
@@ -84,12 +505,15 @@ class ProductViewSet(ViewSet):
         Updates a product with given id with provided values
         """
         product = get_object_or_404(self.queryset, pk=pk)
-        new_product = request.data
-        new_product["rating"] = product.rating
-        new_product["updated_at"] = datetime.now()
-        serializer = ProductSerializer(product)
-        serializer.update(product, new_product)
-        return JsonResponse(serializer.data, status=status.HTTP_200_OK)
+        # Only name and price are writable, ratings and scores are derived from ratings
+        update_serializer = ProductRequestSerializer(product, data=request.data, partial=True)
+        if not update_serializer.is_valid():
+            return JsonResponse(update_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        with transaction.atomic():
+            product = update_serializer.save(updated_at=timezone.now())
+        version = product_cache.invalidate_product(product.id, product.change_seq)
+        product_rankings.product_changed(product.id, version)
+        return JsonResponse(ProductSerializer(product).data, status=status.HTTP_200_OK)
 
     def destroy(self, request, pk=None):
         """
@@ -97,6 +521,8 @@ class ProductViewSet(ViewSet):
         """
         product = get_object_or_404(self.queryset, pk=pk)
         product.delete()
+        version = product_cache.invalidate_product(int(pk), product.change_seq)
+        product_rankings.product_deleted(int(pk), version)
         return HttpResponse(status=status.HTTP_200_OK)
 
     @extend_schema(request=ProductRatingRequestSerializer)
@@ -105,6 +531,7 @@ class ProductViewSet(ViewSet):
         """
         Creates a rating for a product with given id, by user that is authenticated.
         Updates average rating for the product.
+        In write-behind mode the rating is queued for drain_ratings and 202 is returned.
         """
         new_product_rating = {
             "user_id": request.user.id,
@@ -113,16 +540,112 @@ class ProductViewSet(ViewSet):
         }
         serializer = ProductRatingSerializer(data=new_product_rating)
         if serializer.is_valid():
-            serializer.save()
-            product = Product.objects.get(pk=pk)
-            product_ratings = product.productrating_set.all()
-            pr_sum = sum(list(map(lambda pr: pr.value, product_ratings)))
-            product.rating = pr_sum / len(product_ratings)
-            product.save()
+            if getattr(settings, "PRODUCTS_RATING_WRITE_BEHIND", False):
+                return self._enqueue_rating(request, serializer.validated_data)
+            with transaction.atomic():
+                product_rating = serializer.save()
+                product = add_rating(pk, product_rating.value)
+            version = product_cache.invalidate_product(product.id, product.change_seq)
+            product_rankings.product_changed(product.id, version)
             return JsonResponse(ProductSerializer(product).data, status=status.HTTP_201_CREATED)
         else:
             return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    def _enqueue_rating(self, request, data):
+        product_id = data["product_id"].id
+        if not enqueue_rating(request.user.id, product_id, data["value"]):
+            return JsonResponse(
+                {"non_field_errors": ["user already rated this product"]},
+                status=status.HTTP_400_BAD_REQUEST)
+        return JsonResponse({"product_id": product_id, "value": data["value"]},
+                            status=status.HTTP_202_ACCEPTED)
+
+    @extend_schema(request=BulkRatingRequestSerializer)
+    @action(detail=False, methods=["POST"], url_path="bulk-rate", permission_classes=[IsAuthenticated])
+    def bulk_rate(self, request):
+        """
+        Creates many ratings at once, by user that is authenticated.
+        Users with permission to add product ratings can rate for other users by passing user_id.
+        Updates average rating of every rated product once.
+        """
+        request_serializer = BulkRatingRequestSerializer(data=request.data)
+        if not request_serializer.is_valid():
+            return JsonResponse(request_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        trusted = request.user.has_perm("products.add_productrating")
+        ratings = []
+        errors = {}
+        for index, item in enumerate(request_serializer.validated_data["ratings"]):
+            item_serializer = BulkRatingItemSerializer(data=item)
+            if not item_serializer.is_valid():
+                errors[index] = item_serializer.errors
+                continue
+            data = item_serializer.validated_data
+            user_id = data.get("user_id", request.user.id)
+            if user_id != request.user.id and not trusted:
+                errors[index] = {"user_id": ["can not rate for other users"]}
+                continue
+            ratings.append((index, user_id, data["product_id"], data["value"]))
+
+        created, rating_errors, change_seq = add_ratings(ratings)
+        errors.update(rating_errors)
+        product_cache.invalidate_products(
+            {rating.product_id_id for rating in created}, change_seq)
+        return JsonResponse({
+            "created": len(created),
+            "errors": [{"index": index, "errors": errors[index]} for index in sorted(errors)],
+        })
+
+    @extend_schema(request={
+        "text/csv": {"type": "string"},
+        "application/x-ndjson": {"type": "string"},
+    })
+    @action(detail=False, methods=["POST"], url_path="bulk", permission_classes=[IsAdminUser])
+    def bulk(self, request):
+        """
+        Creates or updates products by name from NDJSON or CSV body.
+        Body is read as a stream and written in batches.
+        Returns counts of created, updated and failed rows with row errors.
+        """
+        content_type = request.META.get("CONTENT_TYPE", "").split(";")[0].strip()
+        if content_type not in IMPORT_READERS:
+            return JsonResponse(
+                {"content_type": "must be one of {}".format(", ".join(IMPORT_READERS))},
+                status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+        rows = IMPORT_READERS[content_type](iter_stream_lines(request.stream))
+        return JsonResponse(import_products(rows))
+
+    @action(detail=False, methods=["GET"], url_path="cache-stats", permission_classes=[IsAdminUser])
+    def cache_stats(self, request):
+        """
+        Returns hit and miss counters of the product response cache
+        and the token authentication cache in this process.
+        """
+        return JsonResponse(dict(product_cache.stats(), token_auth=token_cache.stats()))
+
+    @action(detail=False, methods=["GET"], url_path="rankings-check", permission_classes=[IsAdminUser])
+    def rankings_check(self, request):
+        """
+        Compares in-memory rankings of this process with full queries of their orderings.
+        Rankings that differ are rebuilt on next use.
+        """
+        mismatched = product_rankings.check()
+        if mismatched:
+            product_rankings.clear()
+        return JsonResponse({"mismatched": [
+            {"order_by": order_by, "order": "dsc" if descending else "asc"}
+            for order_by, descending in mismatched
+        ]})
+
+    def _cached_response(self, request, key, build_response):
+        entry = product_cache.get(key)
+        if entry is not None:
+            return cached_entry_response(request, entry)
+        response = build_response()
+        if response.status_code == status.HTTP_200_OK:
+            product_cache.set(key, cache_entry(response))
+        return response
+
 
 @extend_schema(request=CreateUserSerializer, responses={201: None})
 @api_view(['POST'])
@@ -135,3 +658,29 @@ def user_create(request):
         if serializer.is_valid(raise_exception=True):
             serializer.save()
             return HttpResponse(status=status.HTTP_201_CREATED)
+
+
+def metrics(request):
+    """
+    Returns request and cache metrics of this process in Prometheus text format.
+    """
+    lines = [
+        "# HELP products_cache_hits_total Cache hits",
+        "# TYPE products_cache_hits_total counter",
+    ]
+    caches = {"responses": product_cache.stats(), "token_auth": token_cache.stats()}
+    for name, stats in caches.items():
+        lines.append('products_cache_hits_total{{cache="{}"}} {}'.format(name, stats["hits"]))
+    lines += [
+        "# HELP products_cache_misses_total Cache misses",
+        "# TYPE products_cache_misses_total counter",
+    ]
+    for name, stats in caches.items():
+        lines.append('products_cache_misses_total{{cache="{}"}} {}'.format(name, stats["misses"]))
+    lines += [
+        "# HELP products_rating_queue_depth Ratings waiting for drain_ratings",
+        "# TYPE products_rating_queue_depth gauge",
+        "products_rating_queue_depth {}".format(rating_queue_depth()),
+    ]
+    content = registry.render() + "\n".join(lines) + "\n"
+    return HttpResponse(content, content_type="text/plain; version=0.0.4; charset=utf-8")
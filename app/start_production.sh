@@ -0,0 +1,11 @@
+#!/bin/bash
+
+export DATABASE_PROFILE=production
+
+# Apply database migrations
+echo "Apply database migrations"
+python manage.py migrate
+
+# Start server
+echo "Starting server"
+gunicorn -c gunicorn.conf.py